@@ -0,0 +1,99 @@
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.urls import URLPattern
+from rest_framework.permissions import SAFE_METHODS
+
+# Потоки для чтения из БД. У каждого потока свое соединение, поэтому
+# с пулом (DB_POOL) его размер должен быть больше числа потоков.
+# Потоки не переживают fork (gunicorn --preload), поэтому у каждого
+# процесса свой executor.
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.ASYNC_DB_THREADS,
+                thread_name_prefix='db'
+            )
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown()
+            _executor = None
+
+
+def run_with_connections(func, *args, **kwargs):
+    # Django закрывает старые соединения только в потоке запроса,
+    # в потоках executor это делаем сами, как channels.
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def database_sync_to_async(func):
+    """Выполняет func с ORM в потоке executor, не занимая
+    единственный синхронный поток Django."""
+    func = functools.partial(run_with_connections, func)
+
+    async def wrapper(*args, **kwargs):
+        return await sync_to_async(
+            func, thread_sensitive=False, executor=get_executor()
+        )(*args, **kwargs)
+
+    return wrapper
+
+
+def async_view(view):
+    """Асинхронная обертка над представлением DRF.
+
+    Безопасные запросы выполняются вместе с рендерингом ответа в потоках
+    executor и не ждут друг друга. Остальные идут в синхронный поток,
+    как обычное представление под ASGI.
+    """
+
+    def render(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    read = database_sync_to_async(render)
+    write = sync_to_async(view, thread_sensitive=True)
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            return await read(request, *args, **kwargs)
+        return await write(request, *args, **kwargs)
+
+    return wrapper
+
+
+def async_urls(urls, names):
+    """Заменяет представления маршрутов с именами из names
+    асинхронными обертками."""
+    return [
+        URLPattern(
+            url.pattern, async_view(url.callback), url.default_args, url.name
+        )
+        if isinstance(url, URLPattern) and url.name in names else url
+        for url in urls
+    ]
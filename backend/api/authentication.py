@@ -0,0 +1,145 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .metrics import CACHE_REQUESTS
+
+User = get_user_model()
+
+CACHE_KEY = 'auth_token:{}'
+# Поля пользователя, которые хранятся в кэше. Остальные (пароль,
+# счетчики, даты) отложены и загружаются из базы при обращении,
+# а save() их не перезаписывает. Model.from_db ждет значения в порядке
+# полей модели.
+USER_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname in {
+        'id', 'email', 'username', 'first_name', 'last_name',
+        'is_active', 'is_staff', 'is_superuser',
+    }
+)
+
+
+class LocalCache:
+    """Ограниченный по размеру LRU-кэш процесса с временем жизни записей."""
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if time.monotonic() >= expires:
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.max_size <= 0 or self.timeout <= 0:
+            return
+        with self._lock:
+            self._items[key] = (value, time.monotonic() + self.timeout)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+local_cache = LocalCache(
+    settings.AUTH_TOKEN_LOCAL_CACHE_SIZE,
+    settings.AUTH_TOKEN_LOCAL_CACHE_TIMEOUT
+)
+
+
+def get_cache():
+    return caches[settings.AUTH_TOKEN_CACHE_ALIAS]
+
+
+def get_cache_key(key):
+    # В общем кэше токен хранится только в виде хэша.
+    return CACHE_KEY.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+def invalidate_token(key):
+    cache_key = get_cache_key(key)
+    local_cache.delete(cache_key)
+    get_cache().delete(cache_key)
+
+
+def invalidate_user(user_id):
+    for key in Token.objects.filter(user_id=user_id).values_list(
+        'key', flat=True
+    ):
+        invalidate_token(key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication, который ищет токен сначала в кэше процесса,
+    затем в кэше Django и только потом в базе.
+
+    Пользователь восстанавливается из USER_FIELDS без запроса к базе.
+    Записи удаляются при выходе, смене пароля и деактивации (см.
+    api.signals), но кэш процесса в других воркерах живет до
+    AUTH_TOKEN_LOCAL_CACHE_TIMEOUT секунд.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = get_cache_key(key)
+        values = local_cache.get(cache_key)
+        CACHE_REQUESTS.labels(
+            'auth_token_local', 'miss' if values is None else 'hit'
+        ).inc()
+        if values is None:
+            cache = get_cache()
+            values = cache.get(cache_key)
+            CACHE_REQUESTS.labels(
+                'auth_token', 'miss' if values is None else 'hit'
+            ).inc()
+            if values is None:
+                values = self.get_user_values(key)
+                if not values[USER_FIELDS.index('is_active')]:
+                    raise exceptions.AuthenticationFailed(
+                        _('User inactive or deleted.')
+                    )
+                cache.set(
+                    cache_key, values, settings.AUTH_TOKEN_CACHE_TIMEOUT
+                )
+            local_cache.set(cache_key, values)
+        user = User.from_db(DEFAULT_DB_ALIAS, USER_FIELDS, values)
+        token = Token.from_db(DEFAULT_DB_ALIAS, ('key', 'user_id'), (
+            key, user.pk
+        ))
+        token.user = user
+        return user, token
+
+    def get_user_values(self, key):
+        values = Token.objects.filter(key=key).values_list(
+            *(f'user__{name}' for name in USER_FIELDS)
+        ).first()
+        if values is None:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        return values
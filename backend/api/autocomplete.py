@@ -0,0 +1,94 @@
+import bisect
+import threading
+import time
+
+from django.conf import settings
+
+from food.models import Ingredient
+
+from .cache import get_cache
+
+VERSION_KEY = 'ingredient_index:version'
+
+
+class IngredientIndex:
+    """Индекс названий ингредиентов в памяти процесса для автодополнения.
+
+    Названия приводятся к casefold() (корректно для кириллицы) и хранятся
+    отсортированными, поэтому префиксный поиск — это bisect по массиву.
+    Версия индекса хранится в общем кэше справочников: изменение
+    ингредиентов увеличивает ее, и воркеры, собравшие индекс с другой
+    версией, пересобирают его.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+
+    def get_version(self):
+        return get_cache().get_or_set(VERSION_KEY, 1, timeout=None)
+
+    def invalidate(self):
+        cache = get_cache()
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            # Ключа нет (кэш очищен): любая новая версия отличается
+            # от версий, с которыми собраны индексы воркеров.
+            cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        with self._lock:
+            self._index = None
+
+    def _build(self, version):
+        rows = sorted(
+            (name.casefold(), name, pk, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        )
+        keys = [row[0] for row in rows]
+        items = [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, name, pk, measurement_unit in rows
+        ]
+        return keys, items, time.monotonic(), version
+
+    def _get_index(self):
+        version = self.get_version()
+        index = self._index
+        if (
+            index is not None
+            and index[3] == version
+            and time.monotonic() - index[2] < settings.INGREDIENT_INDEX_TIMEOUT
+        ):
+            return index
+        # Версия прочитана до выборки, поэтому индекс, собранный во время
+        # изменения ингредиентов, будет пересобран на следующем запросе.
+        index = self._build(version)
+        with self._lock:
+            self._index = index
+        return index
+
+    def search(self, query, limit):
+        """Сначала совпадения по началу названия, затем по подстроке"""
+        query = query.strip().casefold()
+        keys, items, _, _ = self._get_index()
+        result = []
+        position = bisect.bisect_left(keys, query)
+        while (
+            len(result) < limit
+            and position < len(keys)
+            and keys[position].startswith(query)
+        ):
+            result.append(items[position])
+            position += 1
+        if len(result) < limit:
+            for key, item in zip(keys, items):
+                if query in key and not key.startswith(query):
+                    result.append(item)
+                    if len(result) == limit:
+                        break
+        return result
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,321 @@
+import csv
+import io
+import random
+import statistics
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from food.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient,
+    ShoppingCart, Subscribe, Tag
+)
+
+User = get_user_model()
+
+PERCENTILES = (50, 90, 95, 99)
+BATCH_SIZE = 1000
+# Картинка 1x1 для сценария создания рецепта.
+BENCHMARK_IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAAD'
+    'UlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=='
+)
+BENCHMARK_TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+
+
+def read_ingredients(path, limit=None):
+    with open(path, encoding='utf-8') as file:
+        rows = [
+            Ingredient(name=row[0], measurement_unit=row[1])
+            for row in csv.reader(file) if len(row) == 2
+        ]
+    return rows[:limit] if limit else rows
+
+
+def seed_dataset(ingredients, users=100, recipes=1000, favorites=20,
+                 carts=5, subscriptions=10, ingredients_per_recipe=8,
+                 seed=0):
+    """Заполняет базу синтетическими данными заданного объема.
+
+    favorites, carts и subscriptions — количество на одного пользователя.
+    При одном и том же seed данные получаются одинаковыми.
+    """
+    rng = random.Random(seed)
+    Ingredient.objects.bulk_create(ingredients, batch_size=BATCH_SIZE)
+    ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+    Tag.objects.bulk_create(
+        Tag(name=name, color=color, slug=slug)
+        for name, color, slug in BENCHMARK_TAGS
+    )
+    tag_ids = list(Tag.objects.values_list('id', flat=True))
+    User.objects.bulk_create(
+        (
+            User(
+                email=f'bench{index}@example.com',
+                username=f'bench{index}',
+                first_name='Bench',
+                last_name=str(index),
+            )
+            for index in range(users)
+        ),
+        batch_size=BATCH_SIZE
+    )
+    user_ids = list(User.objects.values_list('id', flat=True))
+    Recipe.objects.bulk_create(
+        (
+            Recipe(
+                author_id=rng.choice(user_ids),
+                name=f'Рецепт {index}',
+                text=f'Описание рецепта {index}',
+                cooking_time=rng.randint(1, 180),
+            )
+            for index in range(recipes)
+        ),
+        batch_size=BATCH_SIZE
+    )
+    # pub_date заполняется автоматически, разносим рецепты по времени,
+    # чтобы сортировки и курсоры работали как на живых данных.
+    now = timezone.now()
+    recipe_list = list(Recipe.objects.only('id'))
+    for index, recipe in enumerate(recipe_list):
+        recipe.pub_date = now - timedelta(minutes=len(recipe_list) - index)
+    Recipe.objects.bulk_update(
+        recipe_list, ('pub_date',), batch_size=BATCH_SIZE
+    )
+    recipe_ids = [recipe.id for recipe in recipe_list]
+    RecipeIngredient.objects.bulk_create(
+        (
+            RecipeIngredient(
+                recipe_id=recipe_id, ingredient_id=ingredient_id,
+                amount=rng.randint(1, 500)
+            )
+            for recipe_id in recipe_ids
+            for ingredient_id in rng.sample(
+                ingredient_ids,
+                min(ingredients_per_recipe, len(ingredient_ids))
+            )
+        ),
+        batch_size=BATCH_SIZE
+    )
+    Recipe.tags.through.objects.bulk_create(
+        (
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in rng.sample(tag_ids, rng.randint(1, len(tag_ids)))
+        ),
+        batch_size=BATCH_SIZE
+    )
+    for model, per_user in ((Favorite, favorites), (ShoppingCart, carts)):
+        model.objects.bulk_create(
+            (
+                model(
+                    user_id=user_id, recipe_id=recipe_id,
+                    created=now - timedelta(hours=rng.randint(0, 24 * 30))
+                )
+                for user_id in user_ids
+                for recipe_id in rng.sample(
+                    recipe_ids, min(per_user, len(recipe_ids))
+                )
+            ),
+            batch_size=BATCH_SIZE
+        )
+    Subscribe.objects.bulk_create(
+        (
+            Subscribe(user_id=user_id, sub_user_id=sub_user_id)
+            for user_id in user_ids
+            for sub_user_id in rng.sample(
+                user_ids, min(subscriptions + 1, len(user_ids))
+            )
+            if sub_user_id != user_id
+        ),
+        batch_size=BATCH_SIZE
+    )
+    # bulk_create не отправляет сигналы, счетчики и списки покупок
+    # пересчитываем разом.
+    call_command('reconcile_counters', stdout=io.StringIO())
+    call_command('update_trending', stdout=io.StringIO())
+    call_command('rebuild_shopping_lists', stdout=io.StringIO())
+
+
+def get_scenarios(rng):
+    """Сценарии: (имя, метод, функция, возвращающая путь и тело)."""
+    tags = dict(Tag.objects.values_list('slug', 'id'))
+    authors = list(
+        Recipe.objects.values_list('author_id', flat=True).distinct()[:50]
+    )
+    names = list(Ingredient.objects.values_list('name', flat=True)[:500])
+    ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+    recipe_ids = list(Recipe.objects.values_list('id', flat=True)[:1000])
+
+    def recipe_body():
+        return {
+            'name': f'Рецепт {rng.random()}',
+            'text': 'Описание',
+            'cooking_time': rng.randint(1, 180),
+            'image': BENCHMARK_IMAGE,
+            'tags': [rng.choice(list(tags.values()))],
+            'ingredients': [
+                {'id': ingredient_id, 'amount': rng.randint(1, 500)}
+                for ingredient_id in rng.sample(ingredient_ids, 5)
+            ],
+        }
+
+    return (
+        ('recipes', 'get', lambda: ('/api/recipes/', None)),
+        ('recipe_detail', 'get', lambda: (
+            f'/api/recipes/{rng.choice(recipe_ids)}/', None
+        )),
+        ('recipes_by_tag', 'get', lambda: (
+            f'/api/recipes/?tags={rng.choice(list(tags))}', None
+        )),
+        ('recipes_by_author', 'get', lambda: (
+            f'/api/recipes/?author={rng.choice(authors)}', None
+        )),
+        ('recipes_favorited', 'get', lambda: (
+            '/api/recipes/?is_favorited=1', None
+        )),
+        ('recipes_in_cart', 'get', lambda: (
+            '/api/recipes/?is_in_shopping_cart=1', None
+        )),
+        ('recipes_popular', 'get', lambda: (
+            '/api/recipes/?ordering=popular', None
+        )),
+        ('recipes_cursor', 'get', lambda: ('/api/recipes/?cursor=', None)),
+        ('subscriptions', 'get', lambda: (
+            '/api/users/subscriptions/?recipes_limit=3', None
+        )),
+        ('download_shopping_cart', 'get', lambda: (
+            '/api/recipes/download_shopping_cart/', None
+        )),
+        ('ingredient_search', 'get', lambda: (
+            f'/api/ingredients/?name={rng.choice(names)[:3]}', None
+        )),
+        ('tags', 'get', lambda: ('/api/tags/', None)),
+        ('recipe_create', 'post', lambda: ('/api/recipes/', recipe_body())),
+    )
+
+
+def get_client(user):
+    client = APIClient()
+    token, _ = Token.objects.get_or_create(user=user)
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+def request(client, method, path, data):
+    if data is None:
+        response = getattr(client, method)(path)
+    else:
+        response = getattr(client, method)(path, data, format='json')
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = (len(values) - 1) * percent / 100
+    lower = int(index)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (index - lower)
+
+
+def run_scenario(client, method, get_request, requests, warmup):
+    for _ in range(warmup):
+        request(client, method, *get_request())
+    timings = []
+    queries = []
+    statuses = {}
+    started = time.perf_counter()
+    for _ in range(requests):
+        path, data = get_request()
+        with CaptureQueriesContext(connection) as context:
+            request_started = time.perf_counter()
+            response = request(client, method, path, data)
+            timings.append(time.perf_counter() - request_started)
+        queries.append(len(context.captured_queries))
+        status = str(response.status_code)
+        statuses[status] = statuses.get(status, 0) + 1
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': requests,
+        'statuses': statuses,
+        'latency_ms': get_latency(timings),
+        'queries': {
+            'min': min(queries),
+            'mean': round(statistics.mean(queries), 2),
+            'max': max(queries),
+        },
+        'throughput_rps': round(requests / elapsed, 2),
+    }
+
+
+def get_latency(timings):
+    latency = {
+        f'p{percent}': round(percentile(timings, percent) * 1000, 3)
+        for percent in PERCENTILES
+    }
+    latency.update(
+        min=round(min(timings) * 1000, 3),
+        max=round(max(timings) * 1000, 3),
+        mean=round(statistics.mean(timings) * 1000, 3),
+    )
+    return latency
+
+
+def fetch(url, token):
+    """GET по HTTP: (время, статус или 'error' при сбое соединения)."""
+    request = urllib.request.Request(
+        url, headers={'Authorization': f'Token {token}'} if token else {}
+    )
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            response.read()
+            status = str(response.status)
+    except urllib.error.HTTPError as error:
+        error.read()
+        status = str(error.code)
+    except OSError:
+        status = 'error'
+    return time.perf_counter() - started, status
+
+
+def run_http_scenario(base_url, token, get_request, requests, warmup,
+                      concurrency):
+    """Прогоняет GET-сценарий по HTTP на запущенном сервере, держа
+    concurrency запросов одновременно."""
+    urls = [
+        base_url + urllib.parse.quote(get_request()[0], safe='/?=&')
+        for _ in range(warmup + requests)
+    ]
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda url: fetch(url, token), urls[:warmup]))
+        started = time.perf_counter()
+        results = list(pool.map(lambda url: fetch(url, token), urls[warmup:]))
+        elapsed = time.perf_counter() - started
+    statuses = {}
+    for _, status in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'statuses': statuses,
+        'latency_ms': get_latency([timing for timing, _ in results]),
+        'throughput_rps': round(requests / elapsed, 2),
+    }
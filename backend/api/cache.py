@@ -0,0 +1,64 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.renderers import JSONRenderer
+
+from .metrics import CACHE_REQUESTS
+
+CACHE_KEY = 'reference:{}'
+
+
+def get_cache():
+    return caches[settings.REFERENCE_CACHE_ALIAS]
+
+
+def invalidate(name):
+    get_cache().delete(CACHE_KEY.format(name))
+
+
+class CachedListMixin:
+    """Отдает список справочника из кэша в виде готового JSON.
+
+    Запросы с параметрами (например, поиск) идут мимо кэша.
+    """
+    cache_name = None
+
+    def get_cached_list(self):
+        cache = get_cache()
+        key = CACHE_KEY.format(self.cache_name)
+        cached = cache.get(key)
+        CACHE_REQUESTS.labels(
+            self.cache_name, 'miss' if cached is None else 'hit'
+        ).inc()
+        if cached is None:
+            serializer = self.get_serializer(self.get_queryset(), many=True)
+            content = JSONRenderer().render(serializer.data)
+            cached = {
+                'content': content,
+                'etag': quote_etag(hashlib.md5(content).hexdigest()),
+                'last_modified': int(time.time()),
+            }
+            cache.set(key, cached, settings.REFERENCE_CACHE_TIMEOUT)
+        return cached
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params:
+            return super().list(request, *args, **kwargs)
+        cached = self.get_cached_list()
+        response = get_conditional_response(
+            request,
+            etag=cached['etag'],
+            last_modified=cached['last_modified'],
+        )
+        if response is None:
+            response = HttpResponse(
+                cached['content'], content_type='application/json'
+            )
+        response['ETag'] = cached['etag']
+        response['Last-Modified'] = http_date(cached['last_modified'])
+        return response
@@ -1,24 +1,14 @@
-from django.db.models import F
+from django.db.models import Sum
 
+from food.models import ShoppingListItem
 
-def create_file_str(shopping_cart):
-    ingredients = []
-    for card in shopping_cart:
-        ingredients.append(
-            card.recipe.ingredients.values(
-                'name', 'measurement_unit',
-                amount=F('recipe_ingredients__amount')
-            ).first()
-        )
-    unique_objects = {}
-    file = ''
-    for ingredient in ingredients:
-        key = (ingredient['name'], ingredient['measurement_unit'])
-        if key in unique_objects:
-            unique_objects[key].append(ingredient)
-        else:
-            unique_objects[key] = [ingredient]
-    for key, ingredient_list in unique_objects.items():
-        total_amount = sum(obj['amount'] for obj in ingredient_list)
-        file += f'{key[0]} ({key[1]}) — {total_amount}\n'
-    return file
+
+def get_shopping_list(user):
+    """Читает готовые суммы ингредиентов из списка покупок пользователя"""
+    return (
+        ShoppingListItem.objects
+        .filter(user=user)
+        .values('ingredient__name', 'ingredient__measurement_unit')
+        .annotate(total_amount=Sum('amount'))
+        .order_by('ingredient__name', 'ingredient__measurement_unit')
+    )
@@ -0,0 +1,94 @@
+import binascii
+import uuid
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from PIL import Image
+from rest_framework import serializers
+
+# Размер куска строки base64, декодируемого за раз.
+BASE64_CHUNK_SIZE = 64 * 1024
+
+
+class Base64ImageField(serializers.ImageField):
+    """Картинка в base64 (data URI), декодируемая по частям во временный
+    файл, без второй полной копии в памяти.
+
+    Размер проверяется по длине строки до декодирования, размеры
+    в пикселях — по заголовку картинки, до чтения ее целиком.
+    В ответе, как и у ImageField, отдается только ссылка на файл.
+    """
+    default_error_messages = {
+        'invalid_base64': 'Картинка должна быть передана в base64.',
+        'max_size': 'Размер картинки не должен превышать {max_size} байт.',
+        'max_dimensions': (
+            'Картинка не должна быть больше {width}x{height} пикселей.'
+        ),
+    }
+
+    def __init__(self, max_size=None, max_dimensions=None, **kwargs):
+        self.max_size = max_size or settings.RECIPE_IMAGE_MAX_SIZE
+        self.max_dimensions = (
+            max_dimensions or settings.RECIPE_IMAGE_MAX_DIMENSIONS
+        )
+        super().__init__(**kwargs)
+
+    def check_size(self, data):
+        # Каждые 4 символа base64 дают не больше 3 байт.
+        if len(data) // 4 * 3 > self.max_size:
+            self.fail('max_size', max_size=self.max_size)
+
+    def check_dimensions(self, image):
+        width, height = self.max_dimensions
+        if image.width > width or image.height > height:
+            self.fail('max_dimensions', width=width, height=height)
+
+    def to_internal_value(self, data):
+        if not isinstance(data, str) or not data:
+            self.fail('invalid_base64')
+        if data.startswith('data:'):
+            _, separator, data = data.partition(';base64,')
+            if not separator:
+                self.fail('invalid_base64')
+        self.check_size(data)
+        file = TemporaryUploadedFile(
+            name=uuid.uuid4().hex,
+            content_type=None,
+            size=0,
+            charset=None
+        )
+        try:
+            # Переносы строк (base64 по MIME) сдвигают группы из 4 символов,
+            # поэтому пробельные символы убираются, а неполная группа
+            # переносится в следующий кусок.
+            rest = ''
+            for start in range(0, len(data), BASE64_CHUNK_SIZE):
+                chunk = rest + ''.join(
+                    data[start:start + BASE64_CHUNK_SIZE].split()
+                )
+                end = len(chunk) - len(chunk) % 4
+                file.write(binascii.a2b_base64(chunk[:end]))
+                rest = chunk[end:]
+            if rest:
+                file.write(binascii.a2b_base64(rest))
+        except binascii.Error:
+            file.close()
+            self.fail('invalid_base64')
+        file.size = file.tell()
+        file.seek(0)
+        try:
+            # Расширение нужно валидатору имени файла, берем его из
+            # заголовка картинки, не декодируя ее целиком.
+            image = Image.open(file)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            file.close()
+            self.fail('invalid_image')
+        try:
+            self.check_dimensions(image)
+        except serializers.ValidationError:
+            file.close()
+            raise
+        image_format = image.format
+        file.seek(0)
+        file.name = f'{file.name}.{image_format.lower()}'
+        return super().to_internal_value(file)
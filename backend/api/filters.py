@@ -1,14 +1,16 @@
 from django.contrib.auth import get_user_model
 from django_filters.rest_framework import FilterSet, filters
-from rest_framework.filters import SearchFilter
 
 from food.models import Recipe, Tag
 
 User = get_user_model()
 
-
-class IngredientFilter(SearchFilter):
-    search_param = 'name'
+RECIPE_ORDERINGS = {
+    'popular': ('-favorites_count', '-pub_date'),
+    'trending': ('-trending_score', '-pub_date'),
+    'newest': ('-pub_date',),
+    'quickest': ('cooking_time', '-pub_date'),
+}
 
 
 class RecipesFilter(FilterSet):
@@ -19,6 +21,11 @@ class RecipesFilter(FilterSet):
     )
     is_favorited = filters.BooleanFilter(method='favorited')
     is_in_shopping_cart = filters.BooleanFilter(method='in_cart')
+    search = filters.CharFilter(method='search_recipes')
+    ordering = filters.ChoiceFilter(
+        choices=[(name, name) for name in RECIPE_ORDERINGS],
+        method='order_recipes'
+    )
 
     class Meta:
         model = Recipe
@@ -33,3 +40,9 @@ class RecipesFilter(FilterSet):
         if value and not self.request.user.is_anonymous:
             return queryset.filter(shoppingcarts__user=self.request.user)
         return queryset
+
+    def search_recipes(self, queryset, name, value):
+        return queryset.search(value)
+
+    def order_recipes(self, queryset, name, value):
+        return queryset.order_by(*RECIPE_ORDERINGS[value])
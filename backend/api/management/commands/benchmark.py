@@ -0,0 +1,165 @@
+import json
+import platform
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from api.benchmark import (
+    get_client, get_scenarios, read_ingredients, run_scenario, seed_dataset
+)
+from food.images import wait_for_image_variants
+from food.management.commands.import_ingredients import PATH_CSV
+from food.models import ShoppingCart
+
+User = get_user_model()
+
+INGREDIENTS_CSV = (
+    Path(PATH_CSV),
+    settings.BASE_DIR.parent / PATH_CSV,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a synthetic dataset into a temporary test database, '
+        'run the API endpoints in-process and report latency '
+        'percentiles, queries per request and throughput as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument(
+            '--ingredients', type=int, default=None,
+            help='Number of ingredients to load (all by default)'
+        )
+        parser.add_argument(
+            '--ingredients-csv', help='Path to data/ingredients.csv'
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=20,
+            help='Favorites per user'
+        )
+        parser.add_argument(
+            '--carts', type=int, default=5,
+            help='Shopping cart recipes per user'
+        )
+        parser.add_argument(
+            '--subscriptions', type=int, default=10,
+            help='Subscriptions per user'
+        )
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Measured requests per scenario'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=5,
+            help='Unmeasured requests per scenario'
+        )
+        parser.add_argument(
+            '--scenario', action='append', dest='scenarios',
+            help='Run only the given scenario (can be repeated)'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the JSON report here')
+        parser.add_argument(
+            '--keepdb', action='store_true',
+            help='Keep the test database between runs (PostgreSQL)'
+        )
+
+    def get_ingredients_csv(self, path):
+        candidates = (Path(path),) if path else INGREDIENTS_CSV
+        for candidate in candidates:
+            if candidate.exists():
+                return candidate
+        raise CommandError(
+            'ingredients.csv not found, pass --ingredients-csv'
+        )
+
+    def handle(self, *args, **options):
+        ingredients = read_ingredients(
+            self.get_ingredients_csv(options['ingredients_csv']),
+            options['ingredients']
+        )
+        old_name = connection.settings_dict['NAME']
+        media_root = tempfile.mkdtemp(prefix='foodgram-benchmark-')
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options['keepdb']
+        )
+        try:
+            with override_settings(
+                ALLOWED_HOSTS=['testserver'], MEDIA_ROOT=media_root
+            ):
+                report = self.run(ingredients, options)
+        finally:
+            wait_for_image_variants()
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options['keepdb']
+            )
+            shutil.rmtree(media_root, ignore_errors=True)
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            Path(options['output']).write_text(output, encoding='utf-8')
+            self.stderr.write(f'Report written to {options["output"]}')
+        else:
+            self.stdout.write(output)
+
+    def run(self, ingredients, options):
+        scale = {
+            key: options[key] for key in (
+                'users', 'recipes', 'favorites', 'carts', 'subscriptions'
+            )
+        }
+        # С --keepdb данные остаются от прошлого запуска.
+        if not User.objects.exists():
+            started = time.perf_counter()
+            seed_dataset(ingredients, seed=options['seed'], **scale)
+            self.stderr.write(
+                f'Seeded in {time.perf_counter() - started:.1f}s'
+            )
+        scale['ingredients'] = len(ingredients)
+        rng = random.Random(options['seed'])
+        # Пользователь с корзиной и подписками, как у активного клиента.
+        cart_item = ShoppingCart.objects.select_related('user').first()
+        if cart_item is None:
+            raise CommandError('The dataset has no shopping carts')
+        client = get_client(cart_item.user)
+        scenarios = get_scenarios(rng)
+        if options['scenarios']:
+            unknown = set(options['scenarios']) - {
+                name for name, _, _ in scenarios
+            }
+            if unknown:
+                raise CommandError(
+                    f'Unknown scenarios: {", ".join(sorted(unknown))}'
+                )
+        results = {}
+        for name, method, get_request in scenarios:
+            if options['scenarios'] and name not in options['scenarios']:
+                continue
+            self.stderr.write(f'Running {name}')
+            results[name] = run_scenario(
+                client, method, get_request,
+                options['requests'], options['warmup']
+            )
+        return {
+            'meta': {
+                'timestamp': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'seed': options['seed'],
+                'scale': scale,
+            },
+            'scenarios': results,
+        }
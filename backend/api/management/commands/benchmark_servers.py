@@ -0,0 +1,206 @@
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import connection
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from api.benchmark import (
+    fetch, get_scenarios, read_ingredients, run_http_scenario, seed_dataset
+)
+from food.models import ShoppingCart
+
+from .benchmark import Command as BenchmarkCommand
+
+SERVER_MODES = ('wsgi', 'asgi')
+DEFAULT_SCENARIOS = (
+    'recipes', 'recipe_detail', 'ingredient_search', 'tags', 'subscriptions'
+)
+STARTUP_TIMEOUT = 30
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Seed a synthetic dataset into a temporary test database, start '
+        'gunicorn with sync (WSGI) and uvicorn (ASGI) workers in turn and '
+        'compare latency and throughput of the read endpoints under '
+        'concurrent HTTP load'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument(
+            '--ingredients', type=int, default=None,
+            help='Number of ingredients to load (all by default)'
+        )
+        parser.add_argument(
+            '--ingredients-csv', help='Path to data/ingredients.csv'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=2,
+            help='Gunicorn workers, the same for both modes'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, action='append',
+            help='Concurrent clients (can be repeated, default 1 and 32)'
+        )
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Measured requests per scenario and concurrency'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=10,
+            help='Unmeasured requests per scenario and concurrency'
+        )
+        parser.add_argument(
+            '--mode', action='append', dest='modes', choices=SERVER_MODES,
+            help='Run only the given server mode (can be repeated)'
+        )
+        parser.add_argument(
+            '--scenario', action='append', dest='scenarios',
+            help='GET scenario of the benchmark command (can be repeated)'
+        )
+        parser.add_argument('--port', type=int, default=7800)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the JSON report here')
+
+    def handle(self, *args, **options):
+        ingredients = read_ingredients(
+            self.get_ingredients_csv(options['ingredients_csv']),
+            options['ingredients']
+        )
+        old_name = connection.settings_dict['NAME']
+        workdir = tempfile.mkdtemp(prefix='foodgram-benchmark-')
+        if connection.vendor == 'sqlite':
+            # Серверам нужна та же база, а SQLite в памяти им не видна.
+            connection.settings_dict['TEST']['NAME'] = str(
+                Path(workdir) / 'benchmark.sqlite3'
+            )
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            report = self.run(ingredients, workdir, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(workdir, ignore_errors=True)
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            Path(options['output']).write_text(output, encoding='utf-8')
+            self.stderr.write(f'Report written to {options["output"]}')
+        else:
+            self.stdout.write(output)
+
+    def run(self, ingredients, workdir, options):
+        scale = {key: options[key] for key in ('users', 'recipes')}
+        started = time.perf_counter()
+        seed_dataset(ingredients, seed=options['seed'], **scale)
+        self.stderr.write(f'Seeded in {time.perf_counter() - started:.1f}s')
+        scale['ingredients'] = len(ingredients)
+        cart_item = ShoppingCart.objects.select_related('user').first()
+        if cart_item is None:
+            raise CommandError('The dataset has no shopping carts')
+        token, _ = Token.objects.get_or_create(user=cart_item.user)
+        names = options['scenarios'] or DEFAULT_SCENARIOS
+        scenarios = {
+            name: get_request
+            for name, method, get_request in get_scenarios(
+                random.Random(options['seed'])
+            )
+            if method == 'get' and name in names
+        }
+        unknown = set(names) - set(scenarios)
+        if unknown:
+            raise CommandError(
+                f'Unknown GET scenarios: {", ".join(sorted(unknown))}'
+            )
+        concurrency = options['concurrency'] or (1, 32)
+        results = {}
+        for mode in options['modes'] or SERVER_MODES:
+            results[mode] = {}
+            with self.serve(mode, workdir, options) as base_url:
+                for name in names:
+                    results[mode][name] = {}
+                    for clients in concurrency:
+                        self.stderr.write(
+                            f'Running {name} on {mode}, {clients} clients'
+                        )
+                        results[mode][name][clients] = run_http_scenario(
+                            base_url, token.key, scenarios[name],
+                            options['requests'], options['warmup'], clients
+                        )
+        return {
+            'meta': {
+                'timestamp': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'seed': options['seed'],
+                'scale': scale,
+                'workers': options['workers'],
+            },
+            'modes': results,
+        }
+
+    def get_server_env(self, mode, workdir):
+        env = {
+            **os.environ,
+            'SERVER_MODE': mode,
+            'ALLOWED_HOSTS': '127.0.0.1',
+            'DB_REPLICAS': '',
+            'PROMETHEUS_MULTIPROC_DIR': str(Path(workdir) / mode),
+        }
+        if connection.vendor == 'sqlite':
+            env['SQLITE_NAME'] = str(connection.settings_dict['NAME'])
+        else:
+            env['POSTGRES_DB'] = connection.settings_dict['NAME']
+        return env
+
+    @contextmanager
+    def serve(self, mode, workdir, options):
+        base_url = f'http://127.0.0.1:{options["port"]}'
+        log_path = Path(workdir) / f'{mode}.log'
+        with open(log_path, 'wb') as log:
+            server = subprocess.Popen(
+                (
+                    sys.executable, '-m', 'gunicorn',
+                    '--config', str(settings.BASE_DIR / 'gunicorn.conf.py'),
+                    '--bind', f'127.0.0.1:{options["port"]}',
+                    '--workers', str(options['workers']),
+                ),
+                cwd=settings.BASE_DIR,
+                env=self.get_server_env(mode, workdir),
+                stdout=log,
+                stderr=subprocess.STDOUT,
+            )
+        try:
+            self.wait_for_server(server, base_url, log_path)
+            yield base_url
+        finally:
+            server.terminate()
+            server.wait()
+
+    def wait_for_server(self, server, base_url, log_path):
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                break
+            _, status = fetch(f'{base_url}/api/tags/', '')
+            if status == '200':
+                return
+            time.sleep(0.2)
+        server.terminate()
+        server.wait()
+        log = log_path.read_text(encoding='utf-8', errors='replace')
+        raise CommandError(f'Server did not start:\n{log[-2000:]}')
@@ -0,0 +1,133 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from food.models import Recipe, Tag
+
+User = get_user_model()
+
+# Строки плана, означающие полный просмотр таблицы.
+SEQ_SCAN = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (?:TABLE )?(\w+)(?!.*USING)'),
+}
+INDEX_SCAN = {
+    'postgresql': re.compile(r'Index(?: Only)? Scan (?:using|on) (\w+)'),
+    'sqlite': re.compile(r'USING (?:COVERING )?INDEX (\w+)'),
+}
+EXPLAIN = {
+    'postgresql': 'EXPLAIN ',
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Run EXPLAIN for every query issued by the list endpoints '
+        'and report whether indexes are used'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', help='Email of the user to run the requests as'
+        )
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help='Use EXPLAIN ANALYZE (PostgreSQL only)'
+        )
+        parser.add_argument(
+            '--plans', action='store_true', help='Print full query plans'
+        )
+
+    def get_endpoints(self):
+        endpoints = ['/api/recipes/']
+        tag = Tag.objects.first()
+        if tag:
+            endpoints.append(f'/api/recipes/?tags={tag.slug}')
+        recipe = Recipe.objects.first()
+        if recipe:
+            endpoints.append(f'/api/recipes/?author={recipe.author_id}')
+            endpoints.append(f'/api/recipes/?search={recipe.name.split()[0]}')
+        endpoints += [
+            '/api/recipes/?is_favorited=1',
+            '/api/recipes/?is_in_shopping_cart=1',
+            '/api/users/subscriptions/?recipes_limit=3',
+            '/api/recipes/download_shopping_cart/',
+        ]
+        return endpoints
+
+    def get_user(self, email):
+        if email:
+            user = User.objects.filter(email=email).first()
+            if not user:
+                raise CommandError(f'User {email} does not exist')
+            return user
+        user = (
+            User.objects.filter(shoppingcarts__isnull=False).first()
+            or User.objects.first()
+        )
+        if not user:
+            raise CommandError('There are no users in the database')
+        return user
+
+    def explain(self, sql, analyze):
+        vendor = connection.vendor
+        prefix = EXPLAIN.get(vendor)
+        if prefix is None:
+            raise CommandError(f'EXPLAIN is not supported for {vendor}')
+        if analyze and vendor == 'postgresql':
+            prefix = 'EXPLAIN ANALYZE '
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql)
+            return [' '.join(map(str, row)) for row in cursor.fetchall()]
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        client = APIClient()
+        client.force_authenticate(user)
+        vendor = connection.vendor
+        seq_scans_total = 0
+        for endpoint in self.get_endpoints():
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                with CaptureQueriesContext(connection) as context:
+                    response = client.get(endpoint)
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{endpoint} — {response.status_code}, '
+                f'{len(context.captured_queries)} queries'
+            ))
+            for query in context.captured_queries:
+                sql = query['sql']
+                if not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                plan = self.explain(sql, options['analyze'])
+                plan_text = '\n'.join(plan)
+                indexes = sorted(set(INDEX_SCAN[vendor].findall(plan_text)))
+                seq_scans = sorted(
+                    set(SEQ_SCAN[vendor].findall(plan_text)) - {'subquery'}
+                )
+                seq_scans_total += bool(seq_scans)
+                self.stdout.write(f'  {sql[:100]}...')
+                if options['plans']:
+                    for line in plan:
+                        self.stdout.write(f'      {line}')
+                if indexes:
+                    self.stdout.write(self.style.SUCCESS(
+                        f'    indexes: {", ".join(indexes)}'
+                    ))
+                if seq_scans:
+                    self.stdout.write(self.style.WARNING(
+                        f'    sequential scans: {", ".join(seq_scans)}'
+                    ))
+        if seq_scans_total:
+            self.stdout.write(self.style.WARNING(
+                f'{seq_scans_total} queries use sequential scans. '
+                'On small tables the planner may prefer them to indexes.'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('All queries use indexes'))
@@ -0,0 +1,31 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from api.warmup import warmup
+
+
+class Command(BaseCommand):
+    help = (
+        'Import hot modules, compile URL patterns and prime the reference '
+        'data caches and the first recipe page, reporting the time of '
+        'each step'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--json', action='store_true', help='Print the report as JSON'
+        )
+
+    def handle(self, *args, **options):
+        report = warmup()
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        for step, duration in report['timings_ms'].items():
+            status = report['statuses'].get(step)
+            self.stdout.write(
+                f'{step}: {duration} ms'
+                + (f' (HTTP {status})' if status else '')
+            )
+        self.stdout.write(self.style.SUCCESS('Warmup finished'))
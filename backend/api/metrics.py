@@ -0,0 +1,60 @@
+import os
+import time
+
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram,
+    generate_latest, multiprocess
+)
+
+QUERY_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+REQUEST_LATENCY = Histogram(
+    'foodgram_request_duration_seconds',
+    'Время обработки запроса',
+    ('method', 'route', 'status')
+)
+DB_QUERIES = Histogram(
+    'foodgram_db_queries',
+    'Число запросов к БД на один запрос',
+    ('route',),
+    buckets=QUERY_BUCKETS
+)
+DB_DURATION = Counter(
+    'foodgram_db_duration_seconds',
+    'Суммарное время запросов к БД',
+    ('route',)
+)
+CACHE_REQUESTS = Counter(
+    'foodgram_cache_requests',
+    'Обращения к кэшу справочников',
+    ('cache', 'result')
+)
+SHOPPING_LIST_DURATION = Histogram(
+    'foodgram_shopping_list_duration_seconds',
+    'Время формирования списка покупок',
+    ('format',)
+)
+
+
+def timed_stream(chunks, histogram):
+    """Отдает части потокового ответа, замеряя полное время отдачи."""
+    started = time.perf_counter()
+    yield from chunks
+    histogram.observe(time.perf_counter() - started)
+
+
+def get_registry():
+    # Под gunicorn каждый воркер пишет метрики в файлы
+    # PROMETHEUS_MULTIPROC_DIR, а отдаются они суммой по всем воркерам.
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_view(request):
+    return HttpResponse(
+        generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST
+    )
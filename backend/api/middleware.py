@@ -0,0 +1,309 @@
+import functools
+import hashlib
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import (
+    iscoroutinefunction, markcoroutinefunction, sync_to_async
+)
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+from foodgram.db_router import read_from_replica, selector
+from .metrics import DB_DURATION, DB_QUERIES, REQUEST_LATENCY
+
+logger = logging.getLogger(__name__)
+
+# Обработчики запросов к БД в виде execute_wrapper. Хранятся в
+# contextvar, а не в соединении: под ASGI представление выполняется
+# в другом потоке со своим соединением, а контекст переходит туда
+# вместе с запросом. dispatch_queries подключается к каждому
+# соединению в api.signals.
+query_observers = ContextVar('query_observers', default=())
+
+
+def dispatch_queries(execute, sql, params, many, context):
+    for observer in query_observers.get():
+        execute = functools.partial(observer, execute)
+    return execute(sql, params, many, context)
+
+
+@contextmanager
+def observe_queries(observer):
+    observers = query_observers.get()
+    query_observers.set(observers + (observer,))
+    try:
+        yield
+    finally:
+        # Не reset(token): потоковый ответ под ASGI отдается частями
+        # в разных копиях контекста.
+        query_observers.set(observers)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Представление выполнило больше запросов, чем позволяет бюджет."""
+
+
+class QueryRecorder:
+    """Считает запросы ко всем базам и время их выполнения.
+
+    Отпечаток запроса — SQL без параметров, поэтому повторы одного
+    запроса с разными значениями (N+1) тоже считаются дубликатами.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.fingerprints[sql] += 1
+
+    def record(self):
+        return observe_queries(self)
+
+    @property
+    def duplicates(self):
+        return {
+            sql: count
+            for sql, count in self.fingerprints.most_common()
+            if count > 1
+        }
+
+
+class SyncAndAsyncMiddleware:
+    """Основа middleware, которое работает и под WSGI, и под ASGI.
+
+    Синхронный вариант подкласс реализует в handle, асинхронный —
+    в __acall__. Без __acall__ Django 3.2 под ASGI переключал бы каждый
+    запрос в единственный синхронный поток.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            # Так Django узнает, что экземпляр нужно ждать через await.
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.handle(request)
+
+    def handle(self, request):
+        raise NotImplementedError
+
+    async def __acall__(self, request):
+        raise NotImplementedError
+
+
+class QueryInstrumentationMiddleware(SyncAndAsyncMiddleware):
+    """Число запросов к БД, их время и время представления для каждого
+    запроса: в заголовке Server-Timing и в логе одной JSON-строкой.
+
+    Включается настройкой QUERY_INSTRUMENTATION. Бюджеты запросов
+    задаются в QUERY_BUDGETS по имени представления, при превышении
+    пишется предупреждение, а при QUERY_BUDGET_STRICT — выбрасывается
+    QueryBudgetExceeded, чтобы тест упал.
+    """
+
+    def handle(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with recorder.record():
+            response = self.get_response(request)
+        return self.finish(request, response, recorder, started)
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with recorder.record():
+            response = await self.get_response(request)
+        return self.finish(request, response, recorder, started)
+
+    def finish(self, request, response, recorder, started):
+        view_time = time.perf_counter() - started
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={recorder.duration * 1000:.2f};'
+            f'desc="{recorder.count} queries"',
+            f'dup;desc="{sum(recorder.duplicates.values())} duplicates"',
+            f'view;dur={view_time * 1000:.2f}',
+        ))
+        if response.streaming:
+            # Запросы потокового ответа выполняются при его отдаче,
+            # в заголовок они не попадают, но учитываются в логе.
+            response.streaming_content = self.stream(
+                response.streaming_content, request, response,
+                recorder, started
+            )
+        else:
+            self.report(request, response, recorder, view_time)
+        return response
+
+    def stream(self, content, request, response, recorder, started):
+        with recorder.record():
+            yield from content
+        self.report(
+            request, response, recorder, time.perf_counter() - started
+        )
+
+    def report(self, request, response, recorder, view_time):
+        view_name = (
+            request.resolver_match.view_name
+            if request.resolver_match else None
+        )
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': view_name,
+            'status': response.status_code,
+            'queries': recorder.count,
+            'db_ms': round(recorder.duration * 1000, 2),
+            'view_ms': round(view_time * 1000, 2),
+            'duplicates': [
+                {'sql': sql, 'count': count}
+                for sql, count in recorder.duplicates.items()
+            ],
+        }, ensure_ascii=False))
+        budget = settings.QUERY_BUDGETS.get(
+            view_name, settings.QUERY_BUDGET_DEFAULT
+        )
+        if budget is None or recorder.count <= budget:
+            return
+        message = (
+            f'{view_name} выполнил {recorder.count} запросов '
+            f'при бюджете {budget}'
+        )
+        if settings.QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+class MetricsMiddleware(SyncAndAsyncMiddleware):
+    """Время ответа и число запросов к БД по маршрутам для /metrics.
+
+    Маршрут — имя представления, а не путь, чтобы id в URL
+    не плодили новые серии.
+    """
+
+    def handle(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with recorder.record():
+            response = self.get_response(request)
+        self.observe(request, response, recorder, started)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with recorder.record():
+            response = await self.get_response(request)
+        self.observe(request, response, recorder, started)
+        return response
+
+    def observe(self, request, response, recorder, started):
+        route = (
+            request.resolver_match.view_name
+            if request.resolver_match else 'unmatched'
+        )
+        REQUEST_LATENCY.labels(
+            request.method, route, response.status_code
+        ).observe(time.perf_counter() - started)
+        DB_QUERIES.labels(route).observe(recorder.count)
+        DB_DURATION.labels(route).inc(recorder.duration)
+
+
+class ReplicaRoutingMiddleware(SyncAndAsyncMiddleware):
+    """Разрешает читать с реплик безопасным запросам к представлениям
+    из DATABASE_REPLICA_VIEWS.
+
+    После записи клиент на DATABASE_PIN_SECONDS закрепляется за основной
+    базой, чтобы видеть свои изменения несмотря на отставание реплик.
+    Метка хранится в cookie (для браузера) и в кэше по хэшу токена
+    (для остальных клиентов; при нескольких воркерах кэш должен быть
+    общим).
+    """
+    cookie_name = 'pin_primary'
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.views = set(settings.DATABASE_REPLICA_VIEWS)
+
+    def get_client_key(self, request):
+        authorization = request.META.get('HTTP_AUTHORIZATION')
+        if not authorization:
+            return None
+        digest = hashlib.sha256(authorization.encode()).hexdigest()
+        return f'pin_primary:{digest}'
+
+    def is_pinned(self, request):
+        if request.COOKIES.get(self.cookie_name):
+            return True
+        key = self.get_client_key(request)
+        return key is not None and cache.get(key) is not None
+
+    def observe_latency(self, execute, sql, params, many, context):
+        alias = context['connection'].alias
+        if alias not in selector.aliases:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            selector.observe(alias, time.perf_counter() - started)
+
+    def handle(self, request):
+        token = read_from_replica.set(False)
+        try:
+            with observe_queries(self.observe_latency):
+                response = self.get_response(request)
+        finally:
+            read_from_replica.reset(token)
+        if request.method not in SAFE_METHODS:
+            self.pin(request, response)
+        return response
+
+    async def __acall__(self, request):
+        token = read_from_replica.set(False)
+        try:
+            with observe_queries(self.observe_latency):
+                response = await self.get_response(request)
+        finally:
+            read_from_replica.reset(token)
+        if request.method not in SAFE_METHODS:
+            await sync_to_async(self.pin)(request, response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, 'cls', view_func)
+        if (
+            request.method in SAFE_METHODS
+            and f'{view.__module__}.{view.__qualname__}' in self.views
+            and not self.is_pinned(request)
+        ):
+            read_from_replica.set(True)
+
+    def pin(self, request, response):
+        seconds = settings.DATABASE_PIN_SECONDS
+        response.set_cookie(
+            self.cookie_name, '1', max_age=seconds, httponly=True,
+            samesite='Lax'
+        )
+        key = self.get_client_key(request)
+        if key is not None:
+            cache.set(key, True, seconds)
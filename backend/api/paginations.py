@@ -1,6 +1,170 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    BasePagination, LimitOffsetPagination, PageNumberPagination
+)
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class LimitPageNumberPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+
+
+class KeysetPagination(BasePagination):
+    """Пагинация по ключу (курсору) без COUNT и OFFSET.
+
+    Курсор хранит поля сортировки queryset (?ordering=, ранг поиска)
+    с id для однозначности и их значения у последней записи страницы,
+    следующая страница выбирается условием «строго после» этих значений.
+    Без явной сортировки используется ordering.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    page_size = 6
+    max_page_size = 100
+    ordering = ('pub_date', 'id')
+    invalid_cursor_message = 'Неверный курсор'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, queryset):
+        ordering = list(queryset.query.order_by) or list(self.ordering)
+        if not all(isinstance(field, str) for field in ordering):
+            raise ImproperlyConfigured(
+                'KeysetPagination supports only field name ordering.'
+            )
+        if not {'id', '-id', 'pk', '-pk'} & set(ordering):
+            ordering.append('id')
+        return tuple(ordering)
+
+    def get_field(self, queryset, name):
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        if name == 'pk':
+            return queryset.model._meta.pk
+        return queryset.model._meta.get_field(name)
+
+    def encode_cursor(self, ordering, position):
+        # DjangoJSONEncoder обрезает время до миллисекунд, а курсору
+        # нужно точное значение, иначе записи на границе повторятся.
+        data = json.dumps([list(ordering), [
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in position
+        ]])
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    def decode_cursor(self, request, queryset, ordering):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            cursor_ordering, position = json.loads(
+                base64.urlsafe_b64decode(cursor.encode())
+            )
+            # Курсор другой сортировки указывает не на ту запись.
+            if (
+                cursor_ordering != list(ordering)
+                or len(position) != len(ordering)
+            ):
+                raise ValueError
+            return [
+                self.get_field(queryset, field.lstrip('-')).to_python(value)
+                for field, value in zip(ordering, position)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_after_filter(self, ordering, position):
+        conditions = []
+        for index, field in enumerate(ordering):
+            condition = {
+                previous.lstrip('-'): value for previous, value in
+                zip(ordering[:index], position[:index])
+            }
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition[f'{field.lstrip("-")}__{lookup}'] = position[index]
+            conditions.append(Q(**condition))
+        return reduce(or_, conditions)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        ordering = self.get_ordering(queryset)
+        position = self.decode_cursor(request, queryset, ordering)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.get_after_filter(
+                ordering, position
+            ))
+        page = list(queryset[:page_size + 1])
+        self.active_ordering = ordering
+        self.next_position = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_position = [
+                getattr(page[-1], field.lstrip('-')) for field in ordering
+            ]
+        return page
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.active_ordering, self.next_position)
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': None,
+            'results': data,
+        })
+
+
+class UserKeysetPagination(KeysetPagination):
+    ordering = ('id',)
+
+
+class CursorOptInPagination(BasePagination):
+    """Включает курсорную пагинацию, если в запросе есть ?cursor=
+    (для первой страницы — пустой), иначе работает обычная."""
+    pagination_class = LimitPageNumberPagination
+    keyset_pagination_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.keyset_pagination_class.cursor_query_param in (
+            request.query_params
+        ):
+            self.paginator = self.keyset_pagination_class()
+        else:
+            self.paginator = self.pagination_class()
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+
+class RecipePagination(CursorOptInPagination):
+    pass
+
+
+class SubscriptionPagination(CursorOptInPagination):
+    pagination_class = LimitOffsetPagination
+    keyset_pagination_class = UserKeysetPagination
@@ -0,0 +1,102 @@
+import csv
+import io
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.renderers import BaseRenderer
+
+PDF_FONT_NAME = 'ShoppingListFont'
+PDF_FONT_SIZE = 12
+PDF_MARGIN = 50
+PDF_CHUNK_SIZE = 64 * 1024
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Базовый рендерер списка покупок.
+
+    Наследники реализуют stream(), который построчно отдает байты,
+    чтобы список можно было передать в StreamingHttpResponse.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            # Ошибки (например, 401) отдаем обычным текстом.
+            return '\n'.join(map(str, data.values())).encode('utf-8')
+        return b''.join(self.stream(data))
+
+    def stream(self, shopping_list):
+        raise NotImplementedError
+
+    @staticmethod
+    def rows(shopping_list):
+        for ingredient in shopping_list:
+            yield (
+                ingredient['ingredient__name'],
+                ingredient['ingredient__measurement_unit'],
+                ingredient['total_amount'],
+            )
+
+
+class TxtShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, shopping_list):
+        for name, unit, amount in self.rows(shopping_list):
+            yield f'{name} ({unit}) — {amount}\n'.encode(self.charset)
+
+
+class CsvShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    header = ('Ингредиент', 'Единица измерения', 'Количество')
+
+    def stream(self, shopping_list):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in (self.header, *self.rows(shopping_list)):
+            writer.writerow(row)
+            yield buffer.getvalue().encode(self.charset)
+            buffer.seek(0)
+            buffer.truncate()
+
+
+class PdfShoppingListRenderer(ShoppingListRenderer):
+    """PDF нельзя отдать построчно: таблица ссылок пишется в конце
+    документа, поэтому файл собирается в буфер и отдается частями."""
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+
+    def stream(self, shopping_list):
+        if PDF_FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(
+                TTFont(PDF_FONT_NAME, settings.SHOPPING_LIST_PDF_FONT)
+            )
+        buffer = io.BytesIO()
+        page = canvas.Canvas(buffer, pagesize=A4)
+        _, height = A4
+        line_height = PDF_FONT_SIZE * 1.5
+        y = height - PDF_MARGIN
+        page.setFont(PDF_FONT_NAME, PDF_FONT_SIZE)
+        for name, unit, amount in self.rows(shopping_list):
+            if y < PDF_MARGIN:
+                page.showPage()
+                page.setFont(PDF_FONT_NAME, PDF_FONT_SIZE)
+                y = height - PDF_MARGIN
+            page.drawString(PDF_MARGIN, y, f'{name} ({unit}) — {amount}')
+            y -= line_height
+        page.save()
+        buffer.seek(0)
+        yield from iter(lambda: buffer.read(PDF_CHUNK_SIZE), b'')
+
+
+SHOPPING_LIST_RENDERERS = (
+    TxtShoppingListRenderer,
+    CsvShoppingListRenderer,
+    PdfShoppingListRenderer,
+)
@@ -1,16 +1,20 @@
 from djoser.serializers import UserSerializer
+from django.conf import settings
+from django.core.files.storage import default_storage
 from django.db import transaction
-from django.db.models import F
 from django.contrib.auth import get_user_model
-from drf_extra_fields.fields import Base64ImageField
 
 from rest_framework import serializers
 from food.models import (
     Ingredient, Tag,
-    Recipe, RecipeIngredient
+    Recipe, RecipeIngredient, ShoppingListItem
 )
 from rest_framework.exceptions import ValidationError
 
+from food.images import schedule_image_variants
+from food.shopping_list import recipe_ingredients_changed
+from .fields import Base64ImageField
+
 User = get_user_model()
 
 
@@ -26,24 +30,46 @@ class UserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, user):
+        if hasattr(user, 'is_subscribed'):
+            return user.is_subscribed
         request_user = self.context['request'].user
         if not request_user.is_authenticated:
             return False
         return request_user.subscribed.filter(sub_user=user).exists()
 
 
+class ImageVariantsField(serializers.Field):
+    """Ссылки на уменьшенные копии картинки: {'card': {'jpeg': url}}"""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, variants):
+        request = self.context.get('request')
+        result = {}
+        for name, paths in variants.items():
+            result[name] = {}
+            for image_format, path in paths.items():
+                url = default_storage.url(path)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                result[name][image_format] = url
+        return result
+
+
 class RecipeMiniSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
         fields = (
-            'id', 'image', 'name', 'cooking_time'
+            'id', 'image', 'image_variants', 'name', 'cooking_time'
         )
 
 
 class UserSubscribeSerializer(UserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
 
     class Meta(UserSerializer.Meta):
         model = User
@@ -54,14 +80,11 @@ class UserSubscribeSerializer(UserSerializer):
             'recipes', 'recipes_count'
         )
 
-    def get_recipes_count(self, user):
-        return user.recipes.all().count()
-
     def get_recipes(self, user):
-        limit = self.context['request'].query_params.get('recipes_limit')
+        limit = self.context.get('recipes_limit')
         recipes = user.recipes.all()
-        if limit:
-            recipes = recipes[:int(limit)]
+        if limit is not None:
+            recipes = recipes[:limit]
         serializer = RecipeMiniSerializer(
             recipes, many=True, context=self.context
         )
@@ -80,16 +103,52 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit')
 
 
-class WriteRecipeIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(),
+class ShoppingListItemSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit'
     )
 
+    class Meta:
+        model = ShoppingListItem
+        fields = ('id', 'name', 'measurement_unit', 'amount')
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.RECIPE_BATCH_MAX_SIZE
+    )
+
+
+class RecipesLimitSerializer(serializers.Serializer):
+    recipes_limit = serializers.IntegerField(min_value=0, required=False)
+
+
+class WriteRecipeIngredientSerializer(serializers.ModelSerializer):
+    # Существование ингредиентов проверяется одним запросом
+    # в WriteRecipeSerializer.validate.
+    id = serializers.IntegerField()
+
     class Meta:
         model = RecipeIngredient
         fields = ('id', 'amount',)
 
 
+class ReadRecipeIngredientSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='ingredient.id')
+    name = serializers.CharField(source='ingredient.name')
+    measurement_unit = serializers.CharField(
+        source='ingredient.measurement_unit'
+    )
+
+    class Meta:
+        model = RecipeIngredient
+        fields = ('id', 'name', 'measurement_unit', 'amount')
+
+
 class ReadRecipeSerializer(serializers.ModelSerializer):
     author = UserSerializer()
     tags = TagsSerializer(many=True)
@@ -97,31 +156,26 @@ class ReadRecipeSerializer(serializers.ModelSerializer):
     is_in_shopping_cart = serializers.BooleanField(
         default=False, read_only=True
     )
-    ingredients = serializers.SerializerMethodField()
+    ingredients = ReadRecipeIngredientSerializer(
+        source='recipe_ingredients', many=True
+    )
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
         fields = (
             'id', 'tags',
             'author', 'ingredients',
-            'name', 'image',
+            'name', 'image', 'image_variants',
             'is_favorited', 'is_in_shopping_cart',
             'text', 'cooking_time'
         )
 
-    def get_ingredients(self, recipe):
-        return recipe.ingredients.values(
-            'id', 'name', 'measurement_unit',
-            amount=F('recipe_ingredients__amount')
-        )
-
 
 class WriteRecipeSerializer(serializers.ModelSerializer):
     ingredients = WriteRecipeIngredientSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True, queryset=Tag.objects.all(),
-    )
-    image = Base64ImageField(represent_in_base64=True)
+    tags = serializers.ListField(child=serializers.IntegerField())
+    image = Base64ImageField()
 
     class Meta:
         model = Recipe
@@ -143,20 +197,32 @@ class WriteRecipeSerializer(serializers.ModelSerializer):
             raise ValidationError(
                 'В запросе обязательно должны быть тэги'
             )
-        for tag in data['tags']:
-            if data['tags'].count(tag) > 1:
-                raise ValidationError(
-                    'Тэг дублируется'
-                )
-        for ingredient in data['ingredients']:
-            if data['ingredients'].count(ingredient) > 1:
-                raise ValidationError(
-                    'Ингридиент дублируется'
-                )
-            if ingredient['amount'] <= 0:
-                raise ValidationError(
-                    'Количество ингредиента должно быть больше 0'
-                )
+        tags = set(data['tags'])
+        if len(tags) != len(data['tags']):
+            raise ValidationError(
+                'Тэг дублируется'
+            )
+        ingredients = {ingredient['id'] for ingredient in data['ingredients']}
+        if len(ingredients) != len(data['ingredients']):
+            raise ValidationError(
+                'Ингридиент дублируется'
+            )
+        if any(
+            ingredient['amount'] <= 0 for ingredient in data['ingredients']
+        ):
+            raise ValidationError(
+                'Количество ингредиента должно быть больше 0'
+            )
+        if Tag.objects.filter(id__in=tags).count() != len(tags):
+            raise ValidationError(
+                'Тэг не существует'
+            )
+        if Ingredient.objects.filter(
+            id__in=ingredients
+        ).count() != len(ingredients):
+            raise ValidationError(
+                'Ингридиент не существует'
+            )
         return super().validate(data)
 
     def validate_cooking_time(self, cooking_time):
@@ -166,6 +232,16 @@ class WriteRecipeSerializer(serializers.ModelSerializer):
             )
         return cooking_time
 
+    def save(self, **kwargs):
+        try:
+            return super().save(**kwargs)
+        finally:
+            # Временный файл картинки хранилище перемещает при сохранении,
+            # закрываем его явно, как Django закрывает файлы запроса.
+            image = self.validated_data.get('image')
+            if image:
+                image.close()
+
     @transaction.atomic
     def create(self, validated_data):
         ingredients_data = validated_data.pop('ingredients')
@@ -173,8 +249,15 @@ class WriteRecipeSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(
             author=self.context.get('request').user, **validated_data
         )
-        self.create_recipe_ingredients(ingredients_data, recipe)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe, ingredient_id=ingredient['id'],
+                amount=ingredient['amount']
+            )
+            for ingredient in ingredients_data
+        )
         recipe.tags.set(tags_data)
+        schedule_image_variants(recipe)
         return recipe
 
     @transaction.atomic
@@ -182,20 +265,56 @@ class WriteRecipeSerializer(serializers.ModelSerializer):
         tags_data = validated_data.pop('tags')
         ingredients_data = validated_data.pop('ingredients')
         recipe = super().update(recipe, validated_data)
-        recipe.tags.clear()
-        recipe.ingredients.clear()
+        if 'image' in validated_data:
+            schedule_image_variants(recipe)
+        # set() сам вычисляет разницу и трогает только изменившиеся тэги.
         recipe.tags.set(tags_data)
-        self.create_recipe_ingredients(ingredients_data, recipe)
+        self.update_recipe_ingredients(ingredients_data, recipe)
         return recipe
 
-    def create_recipe_ingredients(self, ingredients_data, recipe):
-        for ingredient in ingredients_data:
+    def update_recipe_ingredients(self, ingredients_data, recipe):
+        """Применяет разницу ингредиентов: по одному bulk-запросу
+        на удаление, изменение и добавление."""
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in recipe.recipe_ingredients.all()
+        }
+        amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients_data
+        }
+        recipe_ingredients_changed(recipe.pk, {
+            ingredient_id: amounts.get(ingredient_id, 0) - (
+                current[ingredient_id].amount
+                if ingredient_id in current else 0
+            )
+            for ingredient_id in current.keys() | amounts.keys()
+        })
+        removed = current.keys() - amounts.keys()
+        if removed:
+            recipe.recipe_ingredients.filter(
+                ingredient_id__in=removed
+            ).delete()
+        changed = []
+        for ingredient_id, recipe_ingredient in current.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and amount != recipe_ingredient.amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        added = amounts.keys() - current.keys()
+        if added:
             RecipeIngredient.objects.bulk_create(
-                [RecipeIngredient(
-                    recipe=recipe, ingredient=ingredient['id'],
-                    amount=ingredient['amount']
-                )]
+                RecipeIngredient(
+                    recipe=recipe, ingredient_id=ingredient_id,
+                    amount=amounts[ingredient_id]
+                )
+                for ingredient_id in added
             )
 
     def to_representation(self, recipe):
+        recipe = Recipe.recipe_manager.annotate_recipe(
+            self.context['request']
+        ).get(pk=recipe.pk)
         return ReadRecipeSerializer(recipe, context=self.context).data
@@ -0,0 +1,62 @@
+from django.contrib.auth import get_user_model
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from food.models import Ingredient, Tag
+from food.signals import reference_data_changed
+
+from .authentication import invalidate_token, invalidate_user
+from .autocomplete import ingredient_index
+from .cache import invalidate
+from .middleware import dispatch_queries
+
+User = get_user_model()
+
+CACHE_NAMES = {
+    Tag: 'tags',
+    Ingredient: 'ingredients',
+}
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+@receiver(reference_data_changed)
+def invalidate_reference_cache(sender, **kwargs):
+    invalidate(CACHE_NAMES[sender])
+    if sender is Ingredient:
+        ingredient_index.invalidate()
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    # Выход (djoser token/logout) и удаление пользователя.
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, update_fields,
+                           **kwargs):
+    # Смена пароля, деактивация и правка профиля. Вход обновляет
+    # только last_login, его в кэше нет.
+    if created or (
+        update_fields is not None and set(update_fields) <= {'last_login'}
+    ):
+        return
+    if instance._password is not None:
+        # Пароль сменен через set_password(): выданные токены отзываются,
+        # их записи в кэше удаляет invalidate_deleted_token.
+        Token.objects.filter(user=instance).delete()
+        return
+    invalidate_user(instance.pk)
+
+
+@receiver(connection_created)
+def observe_connection_queries(sender, connection, **kwargs):
+    # Обработчики запросов выбираются из контекста при каждом запросе
+    # (см. api.middleware.query_observers).
+    if dispatch_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(dispatch_queries)
@@ -0,0 +1,802 @@
+import base64
+import io
+import itertools
+import os
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, router
+from django.db.models import Sum
+from django.db.models.signals import pre_save
+from django.test import (
+    SimpleTestCase, TestCase, TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from psycopg2 import extensions
+from prometheus_client import REGISTRY
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from api.authentication import local_cache
+from api.autocomplete import IngredientIndex
+from api.fields import BASE64_CHUNK_SIZE, Base64ImageField
+from api.middleware import QueryBudgetExceeded, observe_queries
+from foodgram.db_router import read_from_replica, selector
+from foodgram.postgresql.pool import close_pools, get_pool
+from food.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, RelationQuerySet,
+    ShoppingCart, ShoppingListItem, Subscribe, Tag
+)
+
+User = get_user_model()
+
+
+def create_user(name):
+    return User.objects.create_user(
+        email=f'{name}@foodgram.ru', username=name, first_name=name,
+        last_name=name, password='Foodgram-2024'
+    )
+
+
+def create_recipe(author, name, tags=(), ingredients=()):
+    recipe = Recipe.objects.create(
+        author=author, name=name, text='Текст', cooking_time=10
+    )
+    recipe.tags.set(tags)
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=amount)
+        for ingredient, amount in ingredients
+    )
+    return recipe
+
+
+def encode_image(width, height, noise=False):
+    """PNG в base64; шум не сжимается и дает большую картинку."""
+    image = Image.frombytes(
+        'RGB', (width, height),
+        os.urandom(width * height * 3) if noise
+        else bytes(width * height * 3)
+    )
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class APITestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('user')
+        cls.authors = [create_user(f'author{index}') for index in range(5)]
+        cls.tags = [
+            Tag.objects.create(name=slug, color='#FFFFFF', slug=slug)
+            for slug in ('breakfast', 'lunch')
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Мука', 'Сахар', 'Соль')
+        ]
+        cls.recipes = [
+            create_recipe(
+                cls.authors[index % len(cls.authors)], f'Рецепт {index}',
+                cls.tags[:1 + index % 2],
+                [
+                    (ingredient, index + 1)
+                    for ingredient in cls.ingredients[:1 + index % 3]
+                ]
+            )
+            for index in range(20)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertShoppingList(self):
+        expected = dict(
+            RecipeIngredient.objects.filter(
+                recipe__shoppingcarts__user=self.user
+            ).values('ingredient').annotate(
+                total=Sum('amount')
+            ).values_list('ingredient', 'total')
+        )
+        self.assertEqual(
+            dict(
+                ShoppingListItem.objects.filter(
+                    user=self.user, amount__gt=0
+                ).values_list('ingredient', 'amount')
+            ),
+            expected
+        )
+
+
+class RecipeListQueriesTest(APITestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    def test_anonymous(self):
+        with self.assertNumQueries(5):
+            response = self.anonymous.get('/api/recipes/?limit=50')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 20)
+
+    def test_authenticated(self):
+        self.client.post(f'/api/users/{self.authors[0].id}/subscribe/')
+        with self.assertNumQueries(5):
+            response = self.client.get('/api/recipes/?limit=50')
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual(len(results), 20)
+        self.assertTrue(all(
+            recipe['author']['is_subscribed']
+            == (recipe['author']['id'] == self.authors[0].id)
+            for recipe in results
+        ))
+        self.assertTrue(all(recipe['ingredients'] for recipe in results))
+
+
+class SubscriptionRecipesLimitTest(APITestCase):
+    """recipes_limit оставляет первые рецепты каждого автора."""
+
+    def test_recipes_limit(self):
+        for author in self.authors[:2]:
+            self.client.post(f'/api/users/{author.id}/subscribe/')
+        response = self.client.get(
+            '/api/users/subscriptions/?recipes_limit=2'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 2)
+        for subscription in response.data['results']:
+            expected = [
+                recipe.id for recipe in self.recipes
+                if recipe.author_id == subscription['id']
+            ][:2]
+            self.assertEqual(
+                [recipe['id'] for recipe in subscription['recipes']],
+                expected
+            )
+            self.assertEqual(subscription['recipes_count'], 4)
+
+    def test_invalid_recipes_limit(self):
+        self.client.post(f'/api/users/{self.authors[0].id}/subscribe/')
+        for limit in ('abc', '-1'):
+            response = self.client.get(
+                f'/api/users/subscriptions/?recipes_limit={limit}'
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('recipes_limit', response.data)
+        response = self.client.post(
+            f'/api/users/{self.authors[1].id}/subscribe/?recipes_limit=abc'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Subscribe.objects.filter(
+            user=self.user, sub_user=self.authors[1]
+        ).exists())
+        response = self.client.post(
+            f'/api/users/{self.authors[1].id}/subscribe/?recipes_limit=1'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['recipes']), 1)
+
+    def test_limit_per_author(self):
+        recipes = Recipe.recipe_manager.filter(
+            author__in=self.authors[:3]
+        ).limit_per_author(1)
+        self.assertEqual(
+            list(recipes.values_list('id', flat=True)),
+            [recipe.id for recipe in self.recipes[:3]]
+        )
+
+
+class IngredientIndexTest(APITestCase):
+    """Индекс другого воркера пересобирается после изменения ингредиентов."""
+
+    def test_invalidated_across_workers(self):
+        worker = IngredientIndex()
+        self.assertEqual(worker.search('мёд', 10), [])
+        honey = Ingredient.objects.create(name='Мёд', measurement_unit='г')
+        self.assertEqual(
+            [item['id'] for item in worker.search('мёд', 10)], [honey.id]
+        )
+
+
+class RecipeCursorPaginationTest(APITestCase):
+    """Курсорная пагинация проходит все рецепты без повторов."""
+
+    def get_pages(self, url):
+        ids = []
+        while url:
+            response = self.anonymous.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_pages(self):
+        self.assertEqual(
+            self.get_pages('/api/recipes/?cursor=&limit=6'),
+            [recipe.id for recipe in self.recipes]
+        )
+
+    def test_ordering(self):
+        for recipe in self.recipes:
+            Recipe.objects.filter(pk=recipe.pk).update(
+                favorites_count=recipe.pk % 4
+            )
+        expected = Recipe.objects.order_by(
+            '-favorites_count', '-pub_date', 'id'
+        ).values_list('id', flat=True)
+        self.assertEqual(
+            self.get_pages('/api/recipes/?ordering=popular&cursor=&limit=3'),
+            list(expected)
+        )
+
+    def test_search(self):
+        expected = Recipe.recipe_manager.all().search('1').values_list(
+            'id', flat=True
+        )
+        self.assertGreater(len(expected), 3)
+        self.assertEqual(
+            self.get_pages('/api/recipes/?search=1&cursor=&limit=3'),
+            list(expected)
+        )
+
+    def test_invalid_cursor(self):
+        response = self.anonymous.get('/api/recipes/?cursor=invalid')
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_of_other_ordering(self):
+        url = self.anonymous.get('/api/recipes/?cursor=&limit=3').data['next']
+        response = self.anonymous.get(f'{url}&ordering=popular')
+        self.assertEqual(response.status_code, 404)
+
+
+class RecipeUpdateCountersTest(APITestCase):
+    """Изменение рецепта не затирает счетчики, обновленные параллельно."""
+
+    def test_patch_keeps_favorites_count(self):
+        recipe = self.recipes[0]
+        author = APIClient()
+        author.force_authenticate(recipe.author)
+
+        def add_favorite(sender, instance, **kwargs):
+            # Добавление в избранное между чтением и сохранением рецепта.
+            Favorite.objects.insert_ignore(user=self.user, recipe=instance)
+
+        pre_save.connect(add_favorite, sender=Recipe)
+        try:
+            response = author.patch(
+                f'/api/recipes/{recipe.id}/',
+                {
+                    'name': 'Новое название',
+                    'text': 'Текст',
+                    'cooking_time': 5,
+                    'tags': [self.tags[0].id],
+                    'ingredients': [
+                        {'id': self.ingredients[0].id, 'amount': 3}
+                    ],
+                },
+                format='json'
+            )
+        finally:
+            pre_save.disconnect(add_favorite, sender=Recipe)
+        self.assertEqual(response.status_code, 200)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, 'Новое название')
+        self.assertEqual(recipe.favorites_count, 1)
+
+
+@override_settings(
+    MIDDLEWARE=[
+        'api.middleware.QueryInstrumentationMiddleware',
+        *settings.MIDDLEWARE
+    ],
+    QUERY_BUDGET_STRICT=True
+)
+class QueryBudgetTest(APITestCase):
+    """Представления укладываются в бюджеты QUERY_BUDGETS."""
+
+    def test_budgets(self):
+        Subscribe.objects.bulk_create(
+            Subscribe(user=self.user, sub_user=author)
+            for author in self.authors
+        )
+        for recipe in self.recipes[:5]:
+            ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        for url in (
+            '/api/recipes/?limit=50',
+            f'/api/recipes/{self.recipes[0].id}/',
+            '/api/recipes/download_shopping_cart/',
+            '/api/users/subscriptions/?recipes_limit=3',
+            '/api/ingredients/',
+            '/api/tags/',
+        ):
+            with self.subTest(url=url), self.assertLogs(
+                'api.middleware', 'INFO'
+            ) as logs:
+                response = self.client.get(url)
+                if response.streaming:
+                    # Запросы потокового ответа проверяются при отдаче.
+                    b''.join(response.streaming_content)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('queries', response['Server-Timing'])
+                self.assertEqual(len(logs.records), 1)
+
+    @override_settings(QUERY_BUDGETS={'recipes-list': 1})
+    def test_exceeded(self):
+        with self.assertLogs('api.middleware', 'INFO'), self.assertRaises(
+            QueryBudgetExceeded
+        ):
+            self.anonymous.get('/api/recipes/')
+
+
+class ShoppingListTest(APITestCase):
+    """Список покупок следует за корзиной и ингредиентами рецептов."""
+
+    def test_cart_and_ingredients_changes(self):
+        recipe = self.recipes[2]
+        for cart_recipe in self.recipes[:4]:
+            self.client.post(f'/api/recipes/{cart_recipe.id}/shopping_cart/')
+        self.assertShoppingList()
+        author = APIClient()
+        author.force_authenticate(recipe.author)
+        response = author.patch(
+            f'/api/recipes/{recipe.id}/',
+            {
+                'tags': [self.tags[0].id],
+                'ingredients': [
+                    {'id': self.ingredients[0].id, 'amount': 10},
+                    {'id': self.ingredients[2].id, 'amount': 1},
+                ],
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertShoppingList()
+        self.client.delete(
+            f'/api/recipes/{self.recipes[0].id}/shopping_cart/'
+        )
+        self.assertShoppingList()
+        response = author.delete(f'/api/recipes/{recipe.id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertShoppingList()
+        self.assertEqual(
+            ShoppingCart.objects.filter(user=self.user).count(), 2
+        )
+
+    def test_admin_cannot_change_cart_item(self):
+        admin = User.objects.create_superuser(
+            email='admin@foodgram.ru', username='admin', first_name='admin',
+            last_name='admin', password='Foodgram-2024'
+        )
+        cart_item = ShoppingCart.objects.create(
+            user=self.user, recipe=self.recipes[0]
+        )
+        self.client.force_login(admin)
+        response = self.client.post(
+            f'/admin/food/shoppingcart/{cart_item.id}/change/',
+            {'user': self.user.id, 'recipe': self.recipes[1].id}
+        )
+        self.assertEqual(response.status_code, 403)
+        cart_item.refresh_from_db()
+        self.assertEqual(cart_item.recipe_id, self.recipes[0].id)
+        self.assertShoppingList()
+
+
+class ToggleCountersTest(APITestCase):
+    """Повторное добавление и удаление не меняют счетчики и список."""
+
+    def assertCounters(self, recipe, favorites, shopping_cart):
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, favorites)
+        self.assertEqual(recipe.shopping_cart_count, shopping_cart)
+
+    def test_toggle(self):
+        recipe = self.recipes[5]
+        for name, counts in (
+            ('favorite', (1, 0)), ('shopping_cart', (1, 1))
+        ):
+            url = f'/api/recipes/{recipe.id}/{name}/'
+            self.assertEqual(self.client.post(url).status_code, 201)
+            self.assertEqual(self.client.post(url).status_code, 400)
+            self.assertCounters(recipe, *counts)
+            self.assertShoppingList()
+        for name, counts in (
+            ('favorite', (0, 1)), ('shopping_cart', (0, 0))
+        ):
+            url = f'/api/recipes/{recipe.id}/{name}/'
+            self.assertEqual(self.client.delete(url).status_code, 204)
+            self.assertEqual(self.client.delete(url).status_code, 400)
+            self.assertCounters(recipe, *counts)
+            self.assertShoppingList()
+
+    def test_delete_missing(self):
+        self.client.post(f'/api/recipes/{self.recipes[0].id}/shopping_cart/')
+        response = self.client.delete(
+            f'/api/recipes/{self.recipes[1].id}/shopping_cart/'
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.delete('/api/recipes/0/shopping_cart/')
+        self.assertEqual(response.status_code, 404)
+        self.assertCounters(self.recipes[1], 0, 0)
+        self.assertShoppingList()
+
+
+class BatchCountersTest(APITestCase):
+    """Пакетные запросы считают только действительно записанные связи."""
+
+    url = '/api/recipes/shopping_cart/'
+
+    def batch(self, method, recipe_ids):
+        response = getattr(self.client, method)(
+            self.url, {'recipes': recipe_ids}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return {
+            result['id']: result['status']
+            for result in response.data['results']
+        }
+
+    def test_batch(self):
+        first, second, third = self.recipes[:3]
+        self.client.post(f'/api/recipes/{first.id}/shopping_cart/')
+        self.assertEqual(
+            self.batch('post', [first.id, second.id, second.id, 10 ** 6]),
+            {first.id: 400, second.id: 201, 10 ** 6: 400}
+        )
+        self.assertEqual(
+            self.batch('delete', [second.id, third.id, 10 ** 6]),
+            {second.id: 204, third.id: 400, 10 ** 6: 404}
+        )
+        for recipe, count in ((first, 1), (second, 0), (third, 0)):
+            recipe.refresh_from_db()
+            self.assertEqual(recipe.shopping_cart_count, count)
+        self.assertShoppingList()
+
+    def test_concurrent_add(self):
+        first, second = self.recipes[:2]
+        insert = RelationQuerySet.insert_ignore_returning
+
+        def insert_after_other_request(queryset, objs):
+            # Параллельный запрос добавил рецепт после проверки.
+            ShoppingCart.objects.create(user=self.user, recipe=first)
+            return insert(queryset, objs)
+
+        with mock.patch.object(
+            RelationQuerySet, 'insert_ignore_returning',
+            insert_after_other_request
+        ):
+            results = self.batch('post', [first.id, second.id])
+        self.assertEqual(results, {first.id: 400, second.id: 201})
+        for recipe in (first, second):
+            recipe.refresh_from_db()
+            self.assertEqual(recipe.shopping_cart_count, 1)
+        self.assertShoppingList()
+
+    def test_concurrent_delete(self):
+        first, second = self.recipes[:2]
+        self.batch('post', [first.id, second.id])
+        delete = RelationQuerySet.delete_returning
+
+        def delete_after_other_request(queryset):
+            # Параллельный запрос удалил рецепт после проверки.
+            ShoppingCart.objects.delete_existing(
+                user=self.user, recipe=first
+            )
+            return delete(queryset)
+
+        with mock.patch.object(
+            RelationQuerySet, 'delete_returning', delete_after_other_request
+        ):
+            results = self.batch('delete', [first.id, second.id])
+        self.assertEqual(results, {first.id: 400, second.id: 204})
+        for recipe in (first, second):
+            recipe.refresh_from_db()
+            self.assertEqual(recipe.shopping_cart_count, 0)
+        self.assertShoppingList()
+
+
+class Base64ImageFieldTest(SimpleTestCase):
+    """Декодирование картинки по частям."""
+
+    def decode(self, data):
+        file = Base64ImageField().to_internal_value(data)
+        try:
+            return file.read()
+        finally:
+            file.close()
+
+    def test_wrapped_base64(self):
+        content = encode_image(200, 200, noise=True)
+        # Строки по 76 символов, как в MIME: переносы есть в каждом куске.
+        data = base64.encodebytes(content).decode()
+        self.assertGreater(len(data), 2 * BASE64_CHUNK_SIZE)
+        self.assertEqual(self.decode(data), content)
+        self.assertEqual(
+            self.decode(f'data:image/png;base64,{data}'), content
+        )
+
+    def test_invalid_base64(self):
+        data = base64.b64encode(encode_image(10, 10)).decode()
+        with self.assertRaises(ValidationError):
+            self.decode(data[:-1])
+
+
+class AdminCountersTest(APITestCase):
+    """Админка не затирает счетчики и не переносит связи со счетчиками."""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser(
+            email='admin@foodgram.ru', username='admin', first_name='admin',
+            last_name='admin', password='Foodgram-2024'
+        )
+        self.client.force_login(self.admin)
+
+    def test_stale_user_save_keeps_counters(self):
+        author = User.objects.get(pk=self.authors[0].pk)
+        create_recipe(author, 'Новый рецепт')
+        Subscribe.objects.create(user=self.user, sub_user=author)
+        author.first_name = 'Автор'
+        author.save()
+        author.refresh_from_db()
+        self.assertEqual(author.first_name, 'Автор')
+        self.assertEqual(author.recipes_count, 5)
+        self.assertEqual(author.followers_count, 1)
+
+    def test_user_counters_read_only(self):
+        response = self.client.get(
+            f'/admin/user/user/{self.authors[0].id}/change/'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            set(response.context['adminform'].readonly_fields),
+            {'recipes_count', 'followers_count'}
+        )
+
+    def test_subscribe_read_only(self):
+        subscribe = Subscribe.objects.create(
+            user=self.user, sub_user=self.authors[0]
+        )
+        response = self.client.post(
+            f'/admin/food/subscribe/{subscribe.id}/change/',
+            {'user': self.user.id, 'sub_user': self.authors[1].id}
+        )
+        self.assertEqual(response.status_code, 403)
+        subscribe.refresh_from_db()
+        self.assertEqual(subscribe.sub_user_id, self.authors[0].id)
+
+    def test_recipe_author_read_only(self):
+        recipe = self.recipes[0]
+        response = self.client.get(
+            f'/admin/food/recipe/{recipe.id}/change/'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('author', response.context['adminform'].readonly_fields)
+        response = self.client.get('/admin/food/recipe/add/')
+        self.assertNotIn(
+            'author', response.context['adminform'].readonly_fields
+        )
+
+
+@override_settings(
+    DATABASE_ROUTERS=['foodgram.db_router.ReplicaRouter'],
+    MIDDLEWARE=[
+        *settings.MIDDLEWARE, 'api.middleware.ReplicaRoutingMiddleware'
+    ]
+)
+class ReplicaRoutingTest(TransactionTestCase):
+    """Чтения идут на реплику, запись и чтения после нее — в основную.
+
+    Реплика — зеркало основной базы. В SQLite соединения зеркала и
+    основной базы не видят незакоммиченных данных друг друга, поэтому
+    здесь TransactionTestCase.
+    """
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('user')
+        self.recipe = create_recipe(create_user('author'), 'Рецепт')
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        patcher = mock.patch.multiple(
+            selector, aliases=('replica',),
+            cycle=itertools.cycle(('replica',))
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request(self, client, method, url, **kwargs):
+        aliases = []
+
+        def record(execute, sql, params, many, context):
+            aliases.append(context['connection'].alias)
+            return execute(sql, params, many, context)
+
+        with observe_queries(record):
+            response = getattr(client, method)(url, **kwargs)
+        self.assertLess(response.status_code, 400)
+        return set(aliases)
+
+    def test_reads_from_replica(self):
+        self.assertEqual(
+            self.request(self.anonymous, 'get', '/api/recipes/'),
+            {'replica'}
+        )
+        self.assertEqual(
+            self.request(self.anonymous, 'get', '/api/tags/'), {'replica'}
+        )
+
+    def test_write_pins_client(self):
+        url = f'/api/recipes/{self.recipe.id}/favorite/'
+        self.assertEqual(self.request(self.client, 'post', url), {'default'})
+        self.assertEqual(
+            self.client.cookies['pin_primary']['max-age'],
+            settings.DATABASE_PIN_SECONDS
+        )
+        self.assertEqual(
+            self.request(self.client, 'get', '/api/recipes/'), {'default'}
+        )
+        # Cookie истекла.
+        self.client.cookies.clear()
+        self.assertEqual(
+            self.request(self.client, 'get', '/api/recipes/'), {'replica'}
+        )
+
+    def test_write_pins_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token pinned')
+        self.request(
+            self.client, 'post',
+            f'/api/recipes/{self.recipe.id}/favorite/'
+        )
+        self.client.cookies.clear()
+        self.assertEqual(
+            self.request(self.client, 'get', '/api/recipes/'), {'default'}
+        )
+        expired = time.time() + settings.DATABASE_PIN_SECONDS + 1
+        with mock.patch(
+            'django.core.cache.backends.locmem.time.time',
+            return_value=expired
+        ):
+            self.assertEqual(
+                self.request(self.client, 'get', '/api/recipes/'),
+                {'replica'}
+            )
+
+    def test_reads_after_write_in_request(self):
+        token = read_from_replica.set(True)
+        try:
+            self.assertEqual(router.db_for_read(Tag), 'replica')
+            self.assertEqual(router.db_for_write(Tag), 'default')
+            self.assertEqual(router.db_for_read(Tag), 'default')
+        finally:
+            read_from_replica.reset(token)
+
+
+class CachedTokenAuthenticationTest(APITestCase):
+    """Токен читается из кэша и перестает действовать при выходе,
+    смене пароля и деактивации."""
+
+    def setUp(self):
+        super().setUp()
+        local_cache.clear()
+        self.addCleanup(local_cache.clear)
+        response = self.anonymous.post(
+            '/api/auth/token/login/',
+            {'email': self.user.email, 'password': 'Foodgram-2024'}
+        )
+        self.token = APIClient()
+        self.token.credentials(
+            HTTP_AUTHORIZATION=f'Token {response.data["auth_token"]}'
+        )
+        self.assertEqual(self.get_me().status_code, 200)
+
+    def get_me(self):
+        return self.token.get('/api/users/me/')
+
+    def assertTokenQueries(self, count):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get_me().status_code, 200)
+        self.assertEqual(
+            sum('authtoken_token' in query['sql'] for query in queries),
+            count
+        )
+
+    def test_cache_hits(self):
+        self.assertTokenQueries(0)
+        # Другой воркер: кэша процесса нет, токен есть в общем кэше.
+        local_cache.clear()
+        self.assertTokenQueries(0)
+        cache.clear()
+        local_cache.clear()
+        self.assertTokenQueries(1)
+
+    def test_logout(self):
+        self.assertEqual(
+            self.token.post('/api/auth/token/logout/').status_code, 204
+        )
+        self.assertEqual(self.get_me().status_code, 401)
+
+    def test_password_change(self):
+        response = self.token.post('/api/users/set_password/', {
+            'current_password': 'Foodgram-2024',
+            'new_password': 'Kvas-Borsch-77',
+        })
+        self.assertEqual(response.status_code, 204, response.data)
+        self.assertEqual(self.get_me().status_code, 401)
+
+    def test_deactivation(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.is_active = False
+        user.save()
+        self.assertEqual(self.get_me().status_code, 401)
+
+
+class RecipeSizeLimitsTest(APITestCase):
+    """Ограничения размера запроса и картинки рецепта."""
+
+    def create(self, image):
+        return self.client.post('/api/recipes/', {
+            'name': 'Рецепт с картинкой',
+            'text': 'Текст',
+            'cooking_time': 10,
+            'tags': [self.tags[0].id],
+            'ingredients': [{'id': self.ingredients[0].id, 'amount': 1}],
+            'image': image,
+        }, format='json')
+
+    def data_uri(self, width, height, noise=False):
+        content = base64.b64encode(encode_image(width, height, noise))
+        return f'data:image/png;base64,{content.decode()}'
+
+    @override_settings(RECIPE_REQUEST_MAX_SIZE=16 * 1024)
+    def test_request_too_large(self):
+        response = self.create(self.data_uri(100, 100, noise=True))
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(Recipe.objects.filter(
+            name='Рецепт с картинкой'
+        ).exists())
+
+    @override_settings(RECIPE_IMAGE_MAX_SIZE=1024)
+    def test_image_too_large(self):
+        response = self.create(self.data_uri(100, 100, noise=True))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['image'][0].code, 'max_size')
+
+    @override_settings(RECIPE_IMAGE_MAX_DIMENSIONS=(50, 50))
+    def test_image_dimensions(self):
+        response = self.create(self.data_uri(51, 10))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['image'][0].code, 'max_dimensions')
+
+
+class ConnectionPoolGaugeTest(SimpleTestCase):
+    """Размер пула мастера не попадает в сумму по воркерам."""
+
+    def sample(self, state):
+        return REGISTRY.get_sample_value(
+            'foodgram_db_pool_connections',
+            {'alias': 'pool-test', 'state': state}
+        )
+
+    def test_close_pools_resets_max(self):
+        pool = get_pool('pool-test', {'NAME': 'test', 'POOL': {'MAX_SIZE': 3}})
+        connection = mock.Mock(closed=False)
+        connection.get_transaction_status.return_value = (
+            extensions.TRANSACTION_STATUS_IDLE
+        )
+        pool.release(pool.acquire(lambda: connection))
+        self.assertEqual(self.sample('max'), 3)
+        self.assertEqual(self.sample('idle'), 1)
+        close_pools()
+        self.assertEqual(self.sample('max'), 0)
+        self.assertEqual(self.sample('idle'), 0)
+        connection.close.assert_called_once()
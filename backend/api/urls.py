@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import SimpleRouter
 
+from .async_views import async_urls
 from .views import (
     UserViewSet, TegViewSet,
     IngredientsViewSet, RecipeViewSet,
@@ -16,9 +18,12 @@ router_v1.register(
     basename='ingredients'
 )
 
+router_urls = router_v1.urls
+if settings.ASYNC_VIEWS:
+    router_urls = async_urls(router_urls, settings.ASYNC_READ_VIEWS)
 
 urlpatterns = [
-    path('', include(router_v1.urls)),
+    path('', include(router_urls)),
     path('', include('djoser.urls')),
     path(r'auth/', include('djoser.urls.authtoken')),
 ]
@@ -1,14 +1,17 @@
-import io
-
-from django.http import FileResponse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.http import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import viewsets, status
 
 from django.contrib.auth import get_user_model
 from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.permissions import IsAuthenticated, AllowAny
 
+from food.signals import cart_items_changed
 from food.models import (
     Tag, Recipe,
     Favorite, Ingredient,
@@ -16,18 +19,26 @@ from food.models import (
 )
 from rest_framework.response import Response
 
-from .paginations import LimitPageNumberPagination
+from .autocomplete import ingredient_index
+from .cache import CachedListMixin
+from .metrics import SHOPPING_LIST_DURATION, timed_stream
+from .parsers import LimitedJSONParser
+from .paginations import RecipePagination, SubscriptionPagination
 from .serializers import (
     TagsSerializer,
     IngredientSerializer,
     WriteRecipeSerializer,
     ReadRecipeSerializer,
     UserSubscribeSerializer,
-    RecipeMiniSerializer
+    RecipeMiniSerializer,
+    RecipeIdsSerializer,
+    RecipesLimitSerializer,
+    ShoppingListItemSerializer
 )
-from .filters import IngredientFilter, RecipesFilter
+from .filters import RecipesFilter
 from .permissions import IsAuthorOrReadOnly
-from .create_file import create_file_str
+from .create_file import get_shopping_list
+from .renderers import SHOPPING_LIST_RENDERERS
 
 User = get_user_model()
 
@@ -41,18 +52,37 @@ class UserViewSet(UserViewSet):
             return (AllowAny(),)
         return super().get_permissions()
 
+    def get_queryset(self):
+        return super().get_queryset().annotate_subscribed(self.request.user)
+
+    def get_recipes_limit(self, request):
+        serializer = RecipesLimitSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data.get('recipes_limit')
+
     @action(
         detail=False,
         methods=['get'],
+        pagination_class=SubscriptionPagination
     )
     def subscriptions(self, request):
+        limit = self.get_recipes_limit(request)
         pages = self.paginate_queryset(
-            User.objects.filter(subscribe__user=self.request.user)
+            User.objects.filter(subscribe__user=request.user)
+            .annotate_subscribed(request.user)
+        )
+        # Нумерация рецептов в limit_per_author идет только по авторам
+        # страницы, а не по всей таблице.
+        recipes = Recipe.recipe_manager.filter(author__in=pages)
+        if limit is not None:
+            recipes = recipes.limit_per_author(limit)
+        prefetch_related_objects(
+            pages, Prefetch('recipes', queryset=recipes)
         )
         serializer = UserSubscribeSerializer(
             pages,
             many=True,
-            context={'request': request}
+            context={'request': request, 'recipes_limit': limit}
         )
         return self.get_paginated_response(serializer.data)
 
@@ -62,52 +92,53 @@ class UserViewSet(UserViewSet):
 
     @subscribe.mapping.post
     def subscribe_add(self, request, id=None):
+        limit = self.get_recipes_limit(request)
         user = User.objects.filter(pk=id).first()
         if not user:
             return Response(
                 {'errors': 'Пользователь не существует'},
                 status=status.HTTP_404_NOT_FOUND
             )
-        if Subscribe.objects.filter(user=request.user, sub_user=user):
+        if user == request.user:
             return Response(
-                {'errors': 'Попытка создания дублирующей подписки'},
+                {'errors': 'Нельзя подписаться на самого себя'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        if user == request.user:
+        if not Subscribe.objects.insert_ignore(
+            user=request.user, sub_user=user
+        ):
             return Response(
-                {'errors': 'Нельзя подписаться на самого себя'},
+                {'errors': 'Попытка создания дублирующей подписки'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        Subscribe.objects.create(user=request.user, sub_user=user)
+        user.is_subscribed = True
         serializer = UserSubscribeSerializer(
-            user, context={'request': request}
+            user, context={'request': request, 'recipes_limit': limit}
         )
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @subscribe.mapping.delete
     def subscribe_delete(self, request, id=None):
-        user = User.objects.filter(pk=id).first()
-        if not user:
-            return Response(
-                {'errors': 'Пользователь не существует'},
-                status=status.HTTP_404_NOT_FOUND
-            )
-
-        del_count, _ = Subscribe.objects.filter(
-            user=request.user, sub_user=user
-        ).delete()
-        if del_count:
+        if Subscribe.objects.delete_existing(
+            user=request.user, sub_user_id=id
+        ):
             return Response(
                 'Успешная отписка',
                 status=status.HTTP_204_NO_CONTENT
             )
+        if not User.objects.filter(pk=id).exists():
+            return Response(
+                {'errors': 'Пользователь не существует'},
+                status=status.HTTP_404_NOT_FOUND
+            )
         return Response(
             {'errors': 'Вы не подписаны на пользователя'},
             status=status.HTTP_400_BAD_REQUEST
         )
 
 
-class TegViewSet(viewsets.ReadOnlyModelViewSet):
+class TegViewSet(CachedListMixin, viewsets.ReadOnlyModelViewSet):
+    cache_name = 'tags'
     queryset = Tag.objects.all()
     serializer_class = TagsSerializer
     permission_classes = (AllowAny,)
@@ -118,7 +149,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
     permission_classes = (IsAuthorOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipesFilter
-    pagination_class = LimitPageNumberPagination
+    pagination_class = RecipePagination
+    parser_classes = (LimitedJSONParser, FormParser, MultiPartParser)
 
     def get_queryset(self):
         return Recipe.recipe_manager.annotate_recipe(self.request)
@@ -135,37 +167,114 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 {'errors': 'Рецепт не существует'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        if model.objects.filter(user=request.user, recipe=recipe):
+        if not model.objects.insert_ignore(user=request.user, recipe=recipe):
             return Response(
                 {'errors': 'Попытка повторного добавления рецепта'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        model.objects.create(user=request.user, recipe=recipe)
         serializer = RecipeMiniSerializer(recipe, context={'request': request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def destroy_favorite_shopping_cart(self, request, model, pk):
-        recipe = Recipe.objects.filter(id=pk).first()
-        if not recipe:
+        # Сначала удаляем, а существование рецепта проверяем,
+        # только если удалять было нечего.
+        if model.objects.delete_existing(user=request.user, recipe_id=pk):
             return Response(
-                {'errors': 'Рецепт не существует'},
-                status=status.HTTP_404_NOT_FOUND
+                'Рецепт удален',
+                status=status.HTTP_204_NO_CONTENT
             )
-        instance = model.objects.filter(
-            user=request.user,
-            recipe=recipe
-        ).first()
-        if not instance:
+        if not Recipe.objects.filter(id=pk).exists():
             return Response(
-                {'errors': 'Рецепта нет'},
-                status=status.HTTP_400_BAD_REQUEST
+                {'errors': 'Рецепт не существует'},
+                status=status.HTTP_404_NOT_FOUND
             )
-        instance.delete()
         return Response(
-            'Рецепт удален',
-            status=status.HTTP_204_NO_CONTENT
+            {'errors': 'Рецепта нет'},
+            status=status.HTTP_400_BAD_REQUEST
         )
 
+    def batch_favorite_shopping_cart(self, request, model):
+        """Добавляет (POST) или удаляет (DELETE) список рецептов.
+
+        Рецепты проверяются одним запросом с IN, запись — одним
+        bulk-запросом. Счетчики и статусы строятся по строкам, которые
+        действительно вставлены или удалены, поэтому параллельные
+        запросы не учитывают одну связь дважды. Для каждого id
+        возвращаются статус и ошибка, как у запроса с одним рецептом.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        adding = request.method == 'POST'
+        with transaction.atomic():
+            # Блокировка не дает удалить рецепты до вставки связей,
+            # иначе INSERT упал бы на внешнем ключе.
+            existing = set(
+                Recipe.objects.filter(id__in=recipe_ids).order_by('pk')
+                .select_for_update().values_list('id', flat=True)
+            )
+            if adding:
+                changed = model.objects.insert_ignore_returning(
+                    model(user=request.user, recipe_id=recipe_id)
+                    for recipe_id in recipe_ids if recipe_id in existing
+                )
+            else:
+                changed = model.objects.filter(
+                    user=request.user, recipe_id__in=existing
+                ).delete_returning()
+            changed = [item.recipe_id for item in changed]
+            cart_items_changed(
+                model, request.user.id, changed, 1 if adding else -1
+            )
+        changed = set(changed)
+        results = []
+        for recipe_id in recipe_ids:
+            if recipe_id not in existing:
+                result = {
+                    'status': (
+                        status.HTTP_400_BAD_REQUEST if adding
+                        else status.HTTP_404_NOT_FOUND
+                    ),
+                    'errors': 'Рецепт не существует',
+                }
+            elif recipe_id not in changed:
+                result = {
+                    'status': status.HTTP_400_BAD_REQUEST,
+                    'errors': (
+                        'Попытка повторного добавления рецепта' if adding
+                        else 'Рецепта нет'
+                    ),
+                }
+            else:
+                result = {
+                    'status': (
+                        status.HTTP_201_CREATED if adding
+                        else status.HTTP_204_NO_CONTENT
+                    ),
+                }
+            results.append({'id': recipe_id, **result})
+        return Response({'results': results})
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='favorite',
+        url_name='favorite-batch',
+        permission_classes=(IsAuthenticated,)
+    )
+    def favorite_batch(self, request):
+        return self.batch_favorite_shopping_cart(request, Favorite)
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='shopping_cart',
+        url_name='shopping-cart-batch',
+        permission_classes=(IsAuthenticated,)
+    )
+    def shopping_cart_batch(self, request):
+        return self.batch_favorite_shopping_cart(request, ShoppingCart)
+
     @action(detail=True)
     def favorite(self, request, pk) -> Response:
         """Добавляет или удаляет рецепт в избранное"""
@@ -180,16 +289,37 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @action(
         detail=False,
-        methods=['get']
+        methods=['get'],
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=SHOPPING_LIST_RENDERERS
     )
     def download_shopping_cart(self, request):
-        user = request.user
-        shopping_cart = user.shoppingcarts.all()
-        file = create_file_str(shopping_cart)
-        file_object = io.BytesIO()
-        file_object.write(file.encode())
-        file_object.seek(0)
-        return FileResponse(file_object, filename='shopping_cart.txt')
+        """Отдает список покупок в формате из ?format=txt|csv|pdf"""
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        response = StreamingHttpResponse(
+            timed_stream(
+                renderer.stream(get_shopping_list(request.user).iterator()),
+                SHOPPING_LIST_DURATION.labels(renderer.format)
+            ),
+            content_type=content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{renderer.format}"'
+        )
+        return response
+
+    @action(detail=False, permission_classes=(IsAuthenticated,))
+    def shopping_list(self, request):
+        """Список покупок в JSON: сумма по каждому ингредиенту корзины"""
+        items = request.user.shopping_list_items.select_related(
+            'ingredient'
+        )
+        return Response(
+            ShoppingListItemSerializer(items, many=True).data
+        )
 
     @action(detail=True, permission_classes=(IsAuthenticated,))
     def shopping_cart(self, request, pk) -> Response:
@@ -208,10 +338,19 @@ class ShoppingCartViewSet(viewsets.ModelViewSet):
     queryset = ShoppingCart.objects.all()
 
 
-class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientsViewSet(CachedListMixin, viewsets.ReadOnlyModelViewSet):
+    cache_name = 'ingredients'
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
     permission_classes = (AllowAny,)
-    filter_backends = (IngredientFilter,)
-    search_fields = ('^name',)
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name:
+            return Response(
+                ingredient_index.search(
+                    name, settings.INGREDIENT_SEARCH_LIMIT
+                )
+            )
+        return super().list(request, *args, **kwargs)
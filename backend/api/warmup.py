@@ -0,0 +1,75 @@
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.db import connections
+from django.test import Client
+from django.urls import get_resolver, reverse
+
+from .async_views import shutdown_executor
+from .autocomplete import ingredient_index
+
+# Модули, которые иначе импортируются на первом запросе к ним.
+HOT_MODULES = (
+    'api.views',
+    'api.serializers',
+    'api.filters',
+    'api.renderers',
+    'api.create_file',
+    'food.shopping_list',
+)
+# Справочники кэшируются в CachedListMixin, первая страница рецептов
+# прогревает сериализаторы, фильтры и пагинацию.
+WARMUP_URLS = (
+    'tags-list',
+    'ingredients-list',
+    'recipes-list',
+)
+
+
+def get_host():
+    for host in settings.ALLOWED_HOSTS:
+        if host == '*':
+            break
+        return host.lstrip('.')
+    return 'localhost'
+
+
+def timed(timings, name, func):
+    started = time.perf_counter()
+    result = func()
+    timings[name] = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+
+def warmup():
+    """Загружает горячие модули и наполняет кэши процесса.
+
+    Возвращает время шагов в миллисекундах и статусы прогревочных
+    запросов.
+    """
+    timings = {}
+    statuses = {}
+    timed(timings, 'imports', lambda: [
+        import_module(module) for module in HOT_MODULES
+    ])
+    # reverse собирает словари маршрутов, resolve компилирует шаблоны.
+    timed(timings, 'urls', lambda: [
+        get_resolver().resolve(reverse(name)) for name in WARMUP_URLS
+    ])
+    timed(timings, 'ingredient_index', lambda: ingredient_index.search('', 1))
+    client = Client(HTTP_HOST=get_host(), raise_request_exception=False)
+    for name in WARMUP_URLS:
+        response = timed(timings, name, lambda: client.get(reverse(name)))
+        statuses[name] = response.status_code
+    return {'timings_ms': timings, 'statuses': statuses}
+
+
+def prepare_fork():
+    """Закрывает соединения и потоки мастера перед запуском воркеров,
+    чтобы воркеры не делили их между собой."""
+    connections.close_all()
+    if any(connections.databases[alias].get('POOL') for alias in connections):
+        from foodgram.postgresql.pool import close_pools
+        close_pools()
+    shutdown_executor()
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from .images import schedule_image_variants
 from .models import Tag, Recipe, Ingredient, ShoppingCart, Favorite
 
 
@@ -8,16 +9,25 @@ class TagAdmin(admin.ModelAdmin):
     list_display = ('name', 'color', 'slug')
 
 
-@admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
+class CartItemAdmin(admin.ModelAdmin):
+    """Связи только добавляются и удаляются: счетчики рецептов и списки
+    покупок пересчитываются сигналами создания и удаления, изменение
+    существующей записи они не учитывают."""
     list_display = ('user', 'recipe')
     list_filter = list_display
 
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ShoppingCart)
+class ShoppingCartAdmin(CartItemAdmin):
+    pass
+
 
 @admin.register(Favorite)
-class FavoriteRecipeAdmin(admin.ModelAdmin):
-    list_display = ('user', 'recipe')
-    list_filter = list_display
+class FavoriteRecipeAdmin(CartItemAdmin):
+    pass
 
 
 @admin.register(Ingredient)
@@ -34,6 +44,21 @@ class RecipeAdmin(admin.ModelAdmin):
     )
     list_filter = ('tags', 'author', 'name')
 
-    @admin.display(description='Счетчик в избранном')
+    @admin.display(
+        description='Счетчик в избранном', ordering='favorites_count'
+    )
     def count_in_favorite(self, recipe):
-        return recipe.favoriterecipes.count()
+        return recipe.favorites_count
+
+    def get_readonly_fields(self, request, recipe=None):
+        # Счетчики рецептов авторов меняются только при создании
+        # и удалении рецепта, поэтому автор после создания не меняется.
+        readonly_fields = super().get_readonly_fields(request, recipe)
+        if recipe is not None:
+            return (*readonly_fields, 'author')
+        return readonly_fields
+
+    def save_model(self, request, recipe, form, change):
+        super().save_model(request, recipe, form, change)
+        if 'image' in form.changed_data:
+            schedule_image_variants(recipe)
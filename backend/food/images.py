@@ -0,0 +1,113 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = 'foodgram/images/variants/'
+# Формат файла варианта: (формат Pillow, расширение, параметры сохранения).
+VARIANT_FORMATS = {
+    'jpeg': ('JPEG', 'jpg', {'quality': 85, 'optimize': True}),
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+}
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS,
+            thread_name_prefix='recipe-images'
+        )
+    return _executor
+
+
+def wait_for_image_variants():
+    """Дожидается обработки уже поставленных в пул картинок."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+def render_variant(image, size, image_format, options):
+    variant = image.copy()
+    variant.thumbnail(size, Image.LANCZOS)
+    buffer = io.BytesIO()
+    variant.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def create_image_variants(recipe_id, image_name):
+    """Создает уменьшенные копии картинки рецепта в JPEG и WebP.
+
+    Если картинку успели заменить, результат отбрасывается.
+    """
+    from .models import Recipe
+
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    with default_storage.open(image_name) as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        image = image.convert('RGB')
+    variants = {}
+    for name, size in settings.IMAGE_VARIANTS.items():
+        variants[name] = {}
+        for key, (image_format, extension, options) in (
+            VARIANT_FORMATS.items()
+        ):
+            path = default_storage.save(
+                f'{VARIANTS_DIR}{stem}_{name}.{extension}',
+                ContentFile(render_variant(image, size, image_format, options))
+            )
+            variants[name][key] = path
+    old_variants = (
+        Recipe.objects.filter(pk=recipe_id)
+        .values_list('image_variants', flat=True).first()
+    )
+    updated = Recipe.objects.filter(pk=recipe_id, image=image_name).update(
+        image_variants=variants
+    )
+    obsolete = variants if not updated else old_variants or {}
+    for paths in obsolete.values():
+        for path in paths.values():
+            default_storage.delete(path)
+
+
+def process_image_variants(recipe_id, image_name, in_pool=True):
+    try:
+        create_image_variants(recipe_id, image_name)
+    except Exception:
+        logger.exception(
+            'Не удалось обработать картинку рецепта %s', recipe_id
+        )
+    finally:
+        if in_pool:
+            # Соединения с БД у потоков пула свои, закрываем их сами.
+            connections.close_all()
+
+
+def schedule_image_variants(recipe):
+    """Ставит обработку картинки в фоновый пул после коммита транзакции.
+
+    При IMAGE_WORKERS = 0 картинка обрабатывается сразу, в том же потоке.
+    """
+    if not recipe.image:
+        return
+    args = (recipe.pk, recipe.image.name)
+    if not settings.IMAGE_WORKERS:
+        transaction.on_commit(
+            lambda: process_image_variants(*args, in_pool=False)
+        )
+        return
+    transaction.on_commit(
+        lambda: get_executor().submit(process_image_variants, *args)
+    )
@@ -3,6 +3,7 @@ import csv
 from django.core.management.base import BaseCommand
 
 from food.models import Ingredient
+from food.signals import reference_data_changed
 
 PATH_CSV = 'data/ingredients.csv'
 
@@ -17,4 +18,5 @@ class Command(BaseCommand):
             for row in csv_reader:
                 objects_to_create.append(Ingredient(**row))
         Ingredient.objects.bulk_create(objects_to_create, batch_size=500)
+        reference_data_changed.send(sender=Ingredient)
         self.stdout.write(self.style.SUCCESS('Data imported successfully'))
@@ -3,6 +3,7 @@ import csv
 from django.core.management.base import BaseCommand
 
 from food.models import Tag
+from food.signals import reference_data_changed
 
 PATH_CSV = 'data/recipes_tag.csv'
 
@@ -16,5 +17,8 @@ class Command(BaseCommand):
             csv_reader = csv.DictReader(file)
             for row in csv_reader:
                 objects_to_create.append(Tag(**row))
-        Tag.objects.bulk_create(objects_to_create, batch_size=100)
+        Tag.objects.bulk_create(
+            objects_to_create, batch_size=100, ignore_conflicts=True
+        )
+        reference_data_changed.send(sender=Tag)
         self.stdout.write(self.style.SUCCESS('Data imported successfully'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from food.shopping_list import rebuild_shopping_lists
+
+
+class Command(BaseCommand):
+    help = 'Recalculate materialized shopping lists from shopping carts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users',
+            help='Only rebuild the list of the user with this id'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild_shopping_lists(options['users'])
+        self.stdout.write(self.style.SUCCESS('Shopping lists rebuilt'))
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from food.signals import COUNTERS
+
+
+def actual_count(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(count=Count('pk'))
+            .values('count')
+        ),
+        0
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalculate denormalized favorite, cart, recipe '
+        'and follower counters'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report counters that have drifted'
+        )
+
+    def handle(self, *args, **options):
+        for model, (owner, field, counter) in COUNTERS.items():
+            actual = actual_count(model, field)
+            drifted = owner.objects.annotate(actual=actual).exclude(
+                **{counter: F('actual')}
+            )
+            drifted_count = drifted.count()
+            if drifted_count and not options['dry_run']:
+                owner.objects.filter(
+                    pk__in=drifted.values('pk')
+                ).update(**{counter: actual})
+            self.stdout.write(
+                f'{owner.__name__}.{counter}: {drifted_count} drifted'
+            )
+        self.stdout.write(self.style.SUCCESS('Counters reconciled'))
@@ -0,0 +1,37 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from food.models import Favorite, Recipe
+
+
+class Command(BaseCommand):
+    help = 'Recalculate time-decayed trending scores of recipes'
+
+    def handle(self, *args, **kwargs):
+        now = timezone.now()
+        half_life = settings.TRENDING_HALF_LIFE_HOURS * 3600
+        favorites = Favorite.objects.filter(
+            created__gte=now - timedelta(days=settings.TRENDING_WINDOW_DAYS)
+        ).values_list('recipe_id', 'created')
+        scores = defaultdict(float)
+        for recipe_id, created in favorites.iterator():
+            age = (now - created).total_seconds()
+            scores[recipe_id] += 0.5 ** (age / half_life)
+        with transaction.atomic():
+            Recipe.objects.exclude(trending_score=0).update(trending_score=0)
+            Recipe.objects.bulk_update(
+                [
+                    Recipe(pk=recipe_id, trending_score=score)
+                    for recipe_id, score in scores.items()
+                ],
+                ('trending_score',),
+                batch_size=500
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Trending scores updated for {len(scores)} recipes'
+        ))
@@ -0,0 +1,45 @@
+from django.db import migrations
+
+SEARCH_INDEXES = (
+    (
+        'food_recipe_search_vector_gin',
+        "food_recipe USING gin "
+        "(to_tsvector('russian', name || ' ' || text))",
+    ),
+    (
+        'food_recipe_name_trgm',
+        'food_recipe USING gin (name gin_trgm_ops)',
+    ),
+    (
+        'food_ingredient_name_upper_trgm',
+        'food_ingredient USING gin (UPPER(name) gin_trgm_ops)',
+    ),
+)
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, definition in SEARCH_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {definition}'
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:40
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_tags(apps, schema_editor):
+    """Объединяет тэги с одинаковым слагом в тэг с меньшим id,
+    чтобы слаг можно было сделать уникальным."""
+    Tag = apps.get_model('food', 'Tag')
+    RecipeTag = apps.get_model('food', 'Recipe').tags.through
+    duplicates = Tag.objects.order_by().values('slug').annotate(
+        count=Count('id'), kept=Min('id')
+    ).filter(count__gt=1)
+    for duplicate in duplicates:
+        kept = duplicate['kept']
+        others = Tag.objects.filter(slug=duplicate['slug']).exclude(id=kept)
+        recipe_ids = set(
+            RecipeTag.objects.filter(tag__in=others).exclude(
+                recipe_id__in=RecipeTag.objects.filter(
+                    tag_id=kept
+                ).values('recipe_id')
+            ).values_list('recipe_id', flat=True)
+        )
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe_id=recipe_id, tag_id=kept)
+            for recipe_id in recipe_ids
+        )
+        others.delete()
+    # В PostgreSQL ALTER TABLE не выполняется, пока есть отложенные
+    # проверки внешних ключей от изменений выше.
+    schema_editor.connection.check_constraints()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0003_recipe_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='recipe',
+            options={'default_related_name': '%(class)ss', 'ordering': ('pub_date',), 'verbose_name': 'Рецепт', 'verbose_name_plural': 'рецепт'},
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(default=None, null=True, upload_to='foodgram/images/', verbose_name='Изображение рецепта'),
+        ),
+        migrations.RunPython(
+            merge_duplicate_tags, migrations.RunPython.noop
+        ),
+        migrations.AlterField(
+            model_name='tag',
+            name='slug',
+            field=models.CharField(max_length=200, unique=True, verbose_name='Слаг'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['pub_date'], name='food_recipe_pub_dat_1d5255_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', 'pub_date'], name='food_recipe_author__b5886f_idx'),
+        ),
+    ]
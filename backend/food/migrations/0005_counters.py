@@ -0,0 +1,54 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:42
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('food', 'Favorite', 'food', 'Recipe', 'recipe_id', 'favorites_count'),
+    (
+        'food', 'ShoppingCart', 'food', 'Recipe', 'recipe_id',
+        'shopping_cart_count'
+    ),
+    ('food', 'Recipe', 'user', 'User', 'author_id', 'recipes_count'),
+    ('food', 'Subscribe', 'user', 'User', 'sub_user_id', 'followers_count'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for app, model_name, owner_app, owner_name, field, counter in COUNTERS:
+        model = apps.get_model(app, model_name)
+        apps.get_model(owner_app, owner_name).objects.update(**{
+            counter: Coalesce(
+                Subquery(
+                    model.objects.filter(**{field: OuterRef('pk')})
+                    .order_by()
+                    .values(field)
+                    .annotate(count=Count('pk'))
+                    .values('count')
+                ),
+                0
+            )
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0004_recipe_indexes'),
+        ('user', '0003_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='shopping_cart_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В корзинах'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -1,14 +1,145 @@
 from django.conf import settings
-from django.db import models
 from django.contrib.auth import get_user_model
-from django.db.models import Value, Exists, OuterRef
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connections, models, router, transaction
+from django.db.models import (
+    BooleanField, Case, Exists, F, FloatField, OuterRef, Prefetch, Q, Value,
+    When, Window
+)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.db.models.sql import InsertQuery
+from django.utils import timezone
 
 User = get_user_model()
 
 
+class RelationQuerySet(models.QuerySet):
+
+    def insert_ignore(self, **values):
+        """Добавляет связь одним INSERT ... ON CONFLICT DO NOTHING.
+
+        Возвращает False, если такая связь уже есть. В отличие от
+        bulk_create(ignore_conflicts=True) видно, была ли вставка,
+        и post_save отправляется только для новой записи.
+        """
+        instance = self.model(**values)
+        using = self._db or router.db_for_write(
+            self.model, instance=instance
+        )
+        inserted = self.using(using).insert_ignore_returning([instance])
+        if inserted:
+            post_save.send(
+                sender=self.model, instance=instance, created=True,
+                update_fields=None, raw=False, using=using
+            )
+        return bool(inserted)
+
+    def insert_ignore_returning(self, objs):
+        """Вставляет связи с ON CONFLICT DO NOTHING и возвращает только
+        действительно вставленные, без сигналов.
+
+        Где INSERT умеет RETURNING для нескольких строк (PostgreSQL) —
+        один запрос, в остальных СУБД — INSERT на связь с проверкой
+        rowcount.
+        """
+        objs = list(objs)
+        if not objs:
+            return []
+        opts = self.model._meta
+        using = self._db or router.db_for_write(self.model)
+        connection = connections[using]
+        fields = [
+            field for field in opts.concrete_fields
+            if field is not opts.auto_field
+        ]
+        if not connection.features.can_return_rows_from_bulk_insert:
+            return [
+                obj for obj in objs
+                if self._insert_ignore(fields, (obj,), using)
+            ]
+        query = InsertQuery(self.model, ignore_conflicts=True)
+        query.insert_values(fields, objs)
+        compiler = query.get_compiler(using)
+        compiler.returning_fields = opts.concrete_fields
+        rows = []
+        with connection.cursor() as cursor:
+            for sql, params in compiler.as_sql():
+                cursor.execute(sql, params)
+                rows.extend(cursor.fetchall())
+        names = [field.attname for field in opts.concrete_fields]
+        return [self.model.from_db(using, names, row) for row in rows]
+
+    def _insert_ignore(self, fields, objs, using):
+        query = InsertQuery(self.model, ignore_conflicts=True)
+        query.insert_values(fields, objs)
+        inserted = 0
+        with connections[using].cursor() as cursor:
+            for sql, params in query.get_compiler(using).as_sql():
+                cursor.execute(sql, params)
+                inserted += cursor.rowcount
+        return inserted
+
+    def delete_existing(self, **values):
+        """Удаляет связь одним DELETE, без предварительного SELECT.
+
+        Сигналы отправляются для экземпляра, собранного из values:
+        обработчикам нужны лишь ссылки связи. pre_delete уходит до
+        DELETE, как у Model.delete(), и если строки не было, изменения
+        его обработчиков откатываются, а post_delete не отправляется.
+        """
+        instance = self.model(**values)
+        using = self._db or router.db_for_write(self.model)
+        with transaction.atomic(using=using):
+            pre_delete.send(
+                sender=self.model, instance=instance, using=using
+            )
+            deleted = self.filter(**values).delete_without_signals()
+            if deleted:
+                post_delete.send(
+                    sender=self.model, instance=instance, using=using
+                )
+            else:
+                transaction.set_rollback(True, using=using)
+        return bool(deleted)
+
+    def delete_returning(self):
+        """Удаляет связи и возвращает удаленные, без сигналов.
+
+        Строки сначала блокируются SELECT ... FOR UPDATE, поэтому
+        параллельное удаление тех же связей ждет и их уже не находит.
+        """
+        using = self._db or router.db_for_write(self.model)
+        with transaction.atomic(using=using):
+            # Порядок по pk: блокировки берутся в одном порядке, и нет
+            # JOIN из ordering модели, иначе FOR UPDATE заблокирует
+            # и пользователей.
+            deleted = list(
+                self.using(using).order_by('pk').select_for_update()
+            )
+            if deleted:
+                self.model.objects.using(using).filter(
+                    pk__in=[obj.pk for obj in deleted]
+                ).delete_without_signals()
+        return deleted
+
+    def delete_without_signals(self):
+        """Один DELETE без SELECT и сигналов, возвращает число строк.
+
+        Счетчики и списки покупок вызывающий код обновляет сам.
+        """
+        return self._raw_delete(self._db or router.db_for_write(self.model))
+
+
 class BaseCartItem(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     recipe = models.ForeignKey('Recipe', on_delete=models.CASCADE)
+    created = models.DateTimeField(
+        verbose_name='Добавлено', default=timezone.now
+    )
+
+    objects = RelationQuerySet.as_manager()
 
     class Meta:
         abstract = True
@@ -34,7 +165,7 @@ class BaseName(models.Model):
 
 class Tag(BaseName):
     color = models.CharField(verbose_name='Цвет', max_length=7)
-    slug = models.CharField(verbose_name='Слаг', max_length=200)
+    slug = models.CharField(verbose_name='Слаг', max_length=200, unique=True)
 
     class Meta(BaseName.Meta):
         verbose_name = 'Тэг'
@@ -61,18 +192,111 @@ class RecipeIngredient(models.Model):
         unique_together = ('recipe', 'ingredient')
 
 
+# Выражение совпадает с GIN-индексом food_recipe_search_vector_gin
+# из миграции, иначе PostgreSQL не сможет его использовать.
+RECIPE_SEARCH_VECTOR = (
+    "to_tsvector('russian', \"food_recipe\".\"name\" || ' ' "
+    "|| \"food_recipe\".\"text\")"
+)
+RECIPE_SEARCH_QUERY = "plainto_tsquery('russian', %s)"
+
+
 class RecipeQuerySet(models.QuerySet):
 
+    def search(self, value):
+        """Поиск по названию, тексту и ингредиентам рецепта.
+
+        В PostgreSQL — полнотекстовый и триграммный поиск по GIN-индексам
+        с ранжированием, в остальных СУБД — icontains.
+        """
+        if connections[self.db].vendor != 'postgresql':
+            return self._search_fallback(value)
+        ingredient_match = RecipeIngredient.objects.filter(
+            recipe=OuterRef('pk'), ingredient__name__icontains=value
+        )
+        return self.annotate(
+            search_rank=RawSQL(
+                f'ts_rank({RECIPE_SEARCH_VECTOR}, {RECIPE_SEARCH_QUERY})',
+                (value,),
+                output_field=FloatField()
+            ) + TrigramSimilarity('name', value)
+        ).filter(
+            Q(RawSQL(
+                f'{RECIPE_SEARCH_VECTOR} @@ {RECIPE_SEARCH_QUERY}',
+                (value,),
+                output_field=BooleanField()
+            ))
+            | Q(name__trigram_similar=value)
+            | Q(Exists(ingredient_match))
+        ).order_by('-search_rank', '-pub_date')
+
+    def _search_fallback(self, value):
+        ingredient_match = RecipeIngredient.objects.filter(
+            recipe=OuterRef('pk'), ingredient__name__icontains=value
+        )
+        return self.annotate(
+            search_rank=Case(
+                When(name__icontains=value, then=Value(2.0)),
+                When(text__icontains=value, then=Value(1.0)),
+                default=Value(0.0),
+                output_field=FloatField()
+            )
+        ).filter(
+            Q(name__icontains=value)
+            | Q(text__icontains=value)
+            | Q(Exists(ingredient_match))
+        ).order_by('-search_rank', '-pub_date')
+
+    def limit_per_author(self, limit):
+        """Оставляет не больше limit первых рецептов каждого автора.
+
+        Рецепты нумеруются одним проходом ROW_NUMBER() OVER (PARTITION BY
+        author_id) по строкам этого же queryset, поэтому его стоит
+        заранее ограничить нужными авторами. Django 3.2 не фильтрует
+        по оконным функциям, условие на номер задается в RawSQL.
+        """
+        numbered = self.order_by().annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=F('author'),
+                order_by=(F('pub_date').asc(), F('pk').asc())
+            )
+        ).values('pk', 'row_number')
+        sql, params = numbered.query.sql_with_params()
+        return self.filter(
+            pk__in=RawSQL(
+                f'SELECT numbered.id FROM ({sql}) numbered '
+                f'WHERE numbered.row_number <= %s',
+                (*params, limit)
+            )
+        )
+
+    def with_related(self, request):
+        return self.prefetch_related(
+            Prefetch(
+                'author',
+                queryset=User.objects.annotate_subscribed(request.user)
+            ),
+            'tags',
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                ).order_by('ingredient__name')
+            ),
+        )
+
     def annotate_recipe(self, request):
+        queryset = self.with_related(request)
         if not request.user.is_authenticated:
             return (
-                self.annotate(
+                queryset.annotate(
                     is_favorited=Value(False),
                     is_in_shopping_cart=Value(False)
                 )
             )
         return (
-            self.annotate(
+            queryset.annotate(
                 is_favorited=Exists(
                     request.user.favorites.filter(recipe=OuterRef('pk'))
                 ),
@@ -101,11 +325,25 @@ class Recipe(BaseName):
         default=None,
         verbose_name='Изображение рецепта'
     )
+    image_variants = models.JSONField(
+        verbose_name='Уменьшенные копии изображения',
+        default=dict,
+        editable=False
+    )
     text = models.TextField(verbose_name='Текст', max_length=200)
     cooking_time = models.PositiveSmallIntegerField(
         verbose_name='Время приготовления'
     )
     pub_date = models.DateTimeField(auto_now_add=True)
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном', default=0, editable=False
+    )
+    shopping_cart_count = models.PositiveIntegerField(
+        verbose_name='В корзинах', default=0, editable=False
+    )
+    trending_score = models.FloatField(
+        verbose_name='Рейтинг популярности', default=0, editable=False
+    )
     tags = models.ManyToManyField(Tag)
     ingredients = models.ManyToManyField(
         Ingredient, through='RecipeIngredient'
@@ -114,16 +352,44 @@ class Recipe(BaseName):
     objects = models.Manager()
     recipe_manager = RecipeManager()
 
+    # Обновляются отдельными UPDATE (сигналы, update_trending, обработка
+    # картинки), поэтому save() существующего рецепта их не записывает:
+    # в загруженном экземпляре они могли устареть.
+    DENORMALIZED_FIELDS = (
+        'image_variants', 'favorites_count', 'shopping_cart_count',
+        'trending_score',
+    )
+
     class Meta(BaseName.Meta):
         verbose_name = 'Рецепт'
         verbose_name_plural = 'рецепт'
         ordering = ('pub_date',)
+        indexes = (
+            models.Index(fields=('pub_date',)),
+            models.Index(fields=('author', 'pub_date')),
+            models.Index(fields=('favorites_count', 'pub_date')),
+            models.Index(fields=('trending_score', 'pub_date')),
+            models.Index(fields=('cooking_time', '-pub_date')),
+        )
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # Отложенные поля не загружены, их Django тоже не сохраняет.
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.DENORMALIZED_FIELDS
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
 
 
 class Favorite(BaseCartItem):
     class Meta(BaseCartItem.Meta):
         verbose_name = 'Избранное'
         verbose_name_plural = 'избранное'
+        indexes = (models.Index(fields=('created',)),)
 
 
 class ShoppingCart(BaseCartItem):
@@ -132,6 +398,27 @@ class ShoppingCart(BaseCartItem):
         verbose_name_plural = 'корзина'
 
 
+class ShoppingListItem(models.Model):
+    """Сумма ингредиента по всем рецептам из корзины пользователя.
+
+    Обновляется при изменении корзины и ингредиентов рецептов
+    (см. food/shopping_list.py), чтобы список покупок читался
+    без пересчета по всем рецептам.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE)
+    amount = models.PositiveIntegerField(
+        verbose_name='Количество', default=0
+    )
+
+    class Meta:
+        verbose_name = 'Список покупок'
+        verbose_name_plural = 'списки покупок'
+        default_related_name = 'shopping_list_items'
+        unique_together = ('user', 'ingredient')
+        ordering = ('ingredient__name',)
+
+
 class Subscribe(models.Model):
     user = models.ForeignKey(
         User,
@@ -146,6 +433,8 @@ class Subscribe(models.Model):
         verbose_name='Subscribe'
     )
 
+    objects = RelationQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Подписки'
         verbose_name_plural = 'подписки'
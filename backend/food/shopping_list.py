@@ -0,0 +1,122 @@
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Greatest
+
+from .models import RecipeIngredient, ShoppingCart, ShoppingListItem
+
+BATCH_SIZE = 1000
+
+
+def change_shopping_lists(user_ids, amounts):
+    """Прибавляет amounts ({id ингредиента: количество}, может быть
+    отрицательным) к спискам покупок пользователей.
+
+    Недостающие строки создаются с нулем, затем все суммы меняются
+    одним UPDATE, поэтому параллельные изменения не теряются.
+    """
+    amounts = {
+        ingredient_id: amount
+        for ingredient_id, amount in amounts.items() if amount
+    }
+    if not user_ids or not amounts:
+        return
+    added = [
+        ingredient_id
+        for ingredient_id, amount in amounts.items() if amount > 0
+    ]
+    if added:
+        ShoppingListItem.objects.bulk_create(
+            (
+                ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id)
+                for user_id in user_ids
+                for ingredient_id in added
+            ),
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True
+        )
+    items = ShoppingListItem.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=amounts
+    )
+    items.update(amount=Greatest(
+        F('amount') + Case(
+            *(
+                When(ingredient_id=ingredient_id, then=Value(amount))
+                for ingredient_id, amount in amounts.items()
+            ),
+            output_field=IntegerField()
+        ),
+        Value(0)
+    ))
+    if len(added) != len(amounts):
+        items.filter(amount=0).delete()
+
+
+def get_recipes_amounts(recipe_ids):
+    return dict(
+        RecipeIngredient.objects.filter(recipe_id__in=recipe_ids)
+        .values('ingredient_id')
+        .annotate(total=Sum('amount'))
+        .values_list('ingredient_id', 'total')
+        .order_by()
+    )
+
+
+def add_recipes(user_id, recipe_ids, sign=1):
+    """Добавляет (sign=-1 — вычитает) ингредиенты рецептов в список
+    покупок пользователя."""
+    if not recipe_ids:
+        return
+    change_shopping_lists((user_id,), {
+        ingredient_id: amount * sign
+        for ingredient_id, amount in get_recipes_amounts(recipe_ids).items()
+    })
+
+
+def add_recipe(user_id, recipe_id):
+    add_recipes(user_id, (recipe_id,))
+
+
+def remove_recipe(user_id, recipe_id):
+    add_recipes(user_id, (recipe_id,), sign=-1)
+
+
+def recipe_ingredients_changed(recipe_id, amounts):
+    """Переносит изменение ингредиентов рецепта в списки покупок
+    всех, у кого он в корзине."""
+    user_ids = list(
+        ShoppingCart.objects.filter(recipe_id=recipe_id)
+        .values_list('user_id', flat=True)
+    )
+    change_shopping_lists(user_ids, amounts)
+
+
+def rebuild_shopping_lists(user_ids=None):
+    """Пересчитывает списки покупок с нуля по корзинам."""
+    items = ShoppingListItem.objects.all()
+    recipe_ingredients = RecipeIngredient.objects.all()
+    if user_ids is not None:
+        items = items.filter(user_id__in=user_ids)
+        recipe_ingredients = recipe_ingredients.filter(
+            recipe__shoppingcarts__user_id__in=user_ids
+        )
+    else:
+        recipe_ingredients = recipe_ingredients.filter(
+            recipe__shoppingcarts__isnull=False
+        )
+    totals = (
+        recipe_ingredients
+        .values('recipe__shoppingcarts__user_id', 'ingredient_id')
+        .annotate(total=Sum('amount'))
+        .order_by()
+    )
+    items.delete()
+    ShoppingListItem.objects.bulk_create(
+        (
+            ShoppingListItem(
+                user_id=row['recipe__shoppingcarts__user_id'],
+                ingredient_id=row['ingredient_id'],
+                amount=row['total']
+            )
+            for row in totals.iterator()
+        ),
+        batch_size=BATCH_SIZE
+    )
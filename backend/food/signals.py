@@ -0,0 +1,78 @@
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+
+from .models import Favorite, Recipe, ShoppingCart, Subscribe
+from .shopping_list import add_recipe, add_recipes, remove_recipe
+
+User = get_user_model()
+
+# Отправляется после массовой загрузки справочников (bulk_create
+# не вызывает post_save), sender — модель Tag или Ingredient.
+reference_data_changed = Signal()
+
+# Счетчик, который меняет создание или удаление объекта модели:
+# модель-владелец счетчика, поле-ссылка на него и имя счетчика.
+COUNTERS = {
+    Favorite: (Recipe, 'recipe_id', 'favorites_count'),
+    ShoppingCart: (Recipe, 'recipe_id', 'shopping_cart_count'),
+    Recipe: (User, 'author_id', 'recipes_count'),
+    Subscribe: (User, 'sub_user_id', 'followers_count'),
+}
+
+
+def change_counter(sender, pks, delta):
+    """Атомарно меняет денормализованный счетчик на delta через F()"""
+    model, _, counter = COUNTERS[sender]
+    if delta < 0:
+        # Не уходим ниже нуля, если счетчик уже разошелся с данными.
+        return model.objects.filter(
+            pk__in=pks, **{f'{counter}__gte': -delta}
+        ).update(**{counter: F(counter) + delta})
+    return model.objects.filter(pk__in=pks).update(
+        **{counter: F(counter) + delta}
+    )
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Subscribe)
+def increment_counter(sender, instance, created, **kwargs):
+    if created:
+        _, field, _ = COUNTERS[sender]
+        change_counter(sender, (getattr(instance, field),), 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Subscribe)
+def decrement_counter(sender, instance, **kwargs):
+    _, field, _ = COUNTERS[sender]
+    change_counter(sender, (getattr(instance, field),), -1)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    if created:
+        add_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, **kwargs):
+    # pre_delete: при удалении рецепта его ингредиенты удаляются
+    # вместе с корзинами, и после удаления вычитать было бы нечего.
+    remove_recipe(instance.user_id, instance.recipe_id)
+
+
+def cart_items_changed(sender, user_id, recipe_ids, delta):
+    """То же, что делают обработчики выше, для массовой вставки
+    (delta=1) или удаления (delta=-1) рецептов пользователя:
+    bulk_create и raw delete сигналов не отправляют."""
+    if not recipe_ids:
+        return
+    change_counter(sender, recipe_ids, delta)
+    if sender is ShoppingCart:
+        add_recipes(user_id, recipe_ids, sign=delta)
@@ -0,0 +1,74 @@
+import itertools
+import threading
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Выставляется middleware на время запроса, который можно читать
+# с реплики (см. api.middleware.ReplicaRoutingMiddleware).
+read_from_replica = ContextVar('read_from_replica', default=False)
+
+
+class ReplicaSelector:
+    """Выбирает реплику по кругу или с наименьшей задержкой.
+
+    Задержка — экспоненциальное скользящее среднее времени запросов,
+    реплики без замеров выбираются в первую очередь.
+    """
+    smoothing = 0.2
+
+    def __init__(self, aliases, strategy):
+        self.aliases = tuple(aliases)
+        self.strategy = strategy
+        self.latency = {}
+        self.lock = threading.Lock()
+        self.cycle = itertools.cycle(self.aliases)
+
+    def choose(self):
+        with self.lock:
+            if self.strategy == 'least_latency':
+                unknown = [
+                    alias for alias in self.aliases
+                    if alias not in self.latency
+                ]
+                if unknown:
+                    return unknown[0]
+                return min(self.aliases, key=self.latency.__getitem__)
+            return next(self.cycle)
+
+    def observe(self, alias, duration):
+        with self.lock:
+            previous = self.latency.get(alias)
+            self.latency[alias] = (
+                duration if previous is None
+                else previous + self.smoothing * (duration - previous)
+            )
+
+
+selector = ReplicaSelector(
+    settings.DATABASE_REPLICAS, settings.DATABASE_REPLICA_SELECTION
+)
+
+
+class ReplicaRouter:
+    """Чтения разрешенных запросов — на реплики, все остальное —
+    на основную базу. Миграции применяются только к основной."""
+
+    def db_for_read(self, model, **hints):
+        if selector.aliases and read_from_replica.get():
+            return selector.choose()
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # После записи остальные чтения запроса тоже идут в основную
+        # базу, иначе реплика могла бы вернуть данные без этой записи.
+        read_from_replica.set(False)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,52 @@
+from asgiref.sync import sync_to_async
+from django.core.handlers import asgi
+
+# Признак конца итератора: next() с ним не выбрасывает StopIteration,
+# которое нельзя передать через корутину.
+END = object()
+
+
+class ASGIHandler(asgi.ASGIHandler):
+    """ASGIHandler, который получает части потокового ответа
+    в синхронном потоке.
+
+    Django 3.2 перебирает потоковый ответ прямо в цикле событий,
+    а генераторы выгрузки списка покупок обращаются к БД, что там
+    запрещено.
+    """
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+        headers = [
+            (
+                header.encode('ascii') if isinstance(header, str)
+                else bytes(header),
+                value.encode('latin1') if isinstance(value, str)
+                else bytes(value),
+            )
+            for header, value in response.items()
+        ]
+        headers.extend(
+            (b'Set-Cookie', cookie.output(header='').encode('ascii').strip())
+            for cookie in response.cookies.values()
+        )
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': headers,
+        })
+        parts = iter(response)
+        get_next = sync_to_async(next, thread_sensitive=True)
+        while True:
+            part = await get_next(parts, END)
+            if part is END:
+                break
+            for chunk, _ in self.chunk_bytes(part):
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': True,
+                })
+        await send({'type': 'http.response.body'})
+        await sync_to_async(response.close, thread_sensitive=True)()
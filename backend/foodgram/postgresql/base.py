@@ -0,0 +1,63 @@
+from django.db.backends.postgresql import base
+
+from .pool import get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL с проверкой соединений и необязательным пулом.
+
+    HEALTH_CHECKS: постоянное соединение (CONN_MAX_AGE) перед первым
+    использованием в запросе проверяется, и, если оно оборвалось,
+    открывается новое, а не падает запрос.
+
+    POOL: соединения берутся из пула процесса и возвращаются в него
+    при закрытии (CONN_MAX_AGE при этом должен быть 0).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_pending = False
+
+    @property
+    def pool(self):
+        if not self.settings_dict.get('POOL'):
+            return None
+        return get_pool(self.alias, self.settings_dict)
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        connection = pool.acquire(
+            lambda: super(DatabaseWrapper, self).get_new_connection(
+                conn_params
+            )
+        )
+        # Уровень изоляции запоминается при создании соединения,
+        # для соединения из пула выставляем его так же.
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level
+        )
+        return connection
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            pool.release(self.connection)
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        # Вызывается в начале и в конце каждого запроса.
+        self.health_check_pending = (
+            self.connection is not None
+            and self.settings_dict.get('HEALTH_CHECKS', False)
+        )
+
+    def ensure_connection(self):
+        if self.health_check_pending:
+            self.health_check_pending = False
+            if not self.in_atomic_block and not self.is_usable():
+                self.close()
+        super().ensure_connection()
@@ -0,0 +1,174 @@
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+from prometheus_client import Counter, Gauge
+
+POOL_CONNECTIONS = Gauge(
+    'foodgram_db_pool_connections',
+    'Соединения пула по состоянию и размер пула (max)',
+    ('alias', 'state'),
+    multiprocess_mode='livesum'
+)
+POOL_EVENTS = Counter(
+    'foodgram_db_pool_events',
+    'Выдачи, создания, отбраковки и таймауты соединений пула',
+    ('alias', 'event')
+)
+POOL_WAIT = Counter(
+    'foodgram_db_pool_wait_seconds',
+    'Суммарное время ожидания свободного соединения',
+    ('alias',)
+)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """Потокобезопасный пул соединений psycopg2 одного алиаса.
+
+    Не больше max_size соединений одновременно; если все заняты,
+    acquire ждет до timeout секунд. Простаивавшие дольше
+    health_check_after секунд соединения перед выдачей проверяются
+    запросом SELECT 1.
+    """
+
+    def __init__(self, alias, max_size, timeout, health_check_after):
+        self.alias = alias
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.lock = threading.Lock()
+        # (соединение, время возврата в пул)
+        self.idle = deque()
+        self.in_use = 0
+        POOL_CONNECTIONS.labels(alias, 'max').set(max_size)
+
+    def count(self, event):
+        POOL_EVENTS.labels(self.alias, event).inc()
+
+    def update_gauges(self):
+        POOL_CONNECTIONS.labels(self.alias, 'in_use').set(self.in_use)
+        POOL_CONNECTIONS.labels(self.alias, 'idle').set(len(self.idle))
+
+    def acquire(self, connect):
+        started = time.monotonic()
+        if not self.slots.acquire(timeout=self.timeout):
+            self.count('timeouts')
+            raise psycopg2.OperationalError(
+                f'Connection pool {self.alias} exhausted: '
+                f'{self.max_size} connections in use for {self.timeout}s'
+            )
+        waited = time.monotonic() - started
+        try:
+            connection = self.take_idle()
+            created = connection is None
+            if created:
+                connection = connect()
+        except BaseException:
+            self.slots.release()
+            raise
+        self.count('created' if created else 'reused')
+        self.count('acquired')
+        with self.lock:
+            self.in_use += 1
+            self.update_gauges()
+        POOL_WAIT.labels(self.alias).inc(waited)
+        return connection
+
+    def take_idle(self):
+        while True:
+            with self.lock:
+                if not self.idle:
+                    return None
+                connection, released_at = self.idle.pop()
+                self.update_gauges()
+            if self.is_healthy(connection, released_at):
+                return connection
+            self.discard(connection)
+
+    def is_healthy(self, connection, released_at):
+        if connection.closed:
+            return False
+        if time.monotonic() - released_at < self.health_check_after:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except psycopg2.Error:
+            return False
+        return True
+
+    def release(self, connection):
+        try:
+            status = (
+                extensions.TRANSACTION_STATUS_UNKNOWN if connection.closed
+                else connection.get_transaction_status()
+            )
+            if status in (
+                extensions.TRANSACTION_STATUS_INTRANS,
+                extensions.TRANSACTION_STATUS_INERROR,
+            ):
+                connection.rollback()
+                status = connection.get_transaction_status()
+            if status == extensions.TRANSACTION_STATUS_IDLE:
+                with self.lock:
+                    self.idle.append((connection, time.monotonic()))
+            else:
+                self.discard(connection)
+        except psycopg2.Error:
+            self.discard(connection)
+        finally:
+            with self.lock:
+                self.in_use -= 1
+                self.update_gauges()
+            self.slots.release()
+
+    def discard(self, connection):
+        self.count('discarded')
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+
+def get_pool(alias, settings_dict):
+    # Тестовый раннер меняет NAME у того же алиаса, поэтому пул
+    # определяется и алиасом, и адресом базы.
+    key = (alias,) + tuple(
+        settings_dict.get(name) for name in ('HOST', 'PORT', 'NAME', 'USER')
+    )
+    with _pools_lock:
+        if key not in _pools:
+            options = settings_dict['POOL']
+            _pools[key] = ConnectionPool(
+                alias,
+                max_size=options.get('MAX_SIZE', 10),
+                timeout=options.get('TIMEOUT', 5),
+                health_check_after=options.get('HEALTH_CHECK_AFTER', 30),
+            )
+        return _pools[key]
+
+
+def close_pools():
+    """Закрывает простаивающие соединения и забывает пулы.
+
+    Нужно перед fork, чтобы воркеры не делили сокеты мастера.
+    Размер пула мастера обнуляется: метрика суммирует живые процессы,
+    и иначе max мастера прибавлялся бы к max каждого воркера.
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        with pool.lock:
+            idle = [connection for connection, _ in pool.idle]
+            pool.idle.clear()
+            pool.update_gauges()
+            POOL_CONNECTIONS.labels(pool.alias, 'max').set(0)
+        for connection in idle:
+            pool.discard(connection)
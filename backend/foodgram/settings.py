@@ -1,4 +1,5 @@
 import os
+import sys
 
 from pathlib import Path
 from dotenv import load_dotenv
@@ -27,10 +28,12 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'django_filters',
     'djoser',
+    'api',
     'food',
     'user',
 ]
@@ -45,6 +48,17 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Метрики для Prometheus на /metrics (см. api/metrics.py).
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+if METRICS_ENABLED:
+    MIDDLEWARE.insert(0, 'api.middleware.MetricsMiddleware')
+
+# Учет запросов к БД и времени ответа (Server-Timing и лог),
+# включается явно, например в тестах или на стенде.
+QUERY_INSTRUMENTATION = os.getenv('QUERY_INSTRUMENTATION', 'False') == 'True'
+if QUERY_INSTRUMENTATION:
+    MIDDLEWARE.insert(0, 'api.middleware.QueryInstrumentationMiddleware')
+
 ROOT_URLCONF = 'foodgram.urls'
 
 TEMPLATES = [
@@ -71,24 +85,124 @@ if os.getenv("USE_SQLITE", 'False') == 'True':
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': BASE_DIR / 'db.sqlite3',
+            'NAME': os.getenv('SQLITE_NAME', BASE_DIR / 'db.sqlite3'),
         }
     }
 else:
+    # Пул соединений процесса (см. foodgram/postgresql): соединения
+    # возвращаются в него после каждого запроса. Без пула соединение
+    # живет DB_CONN_MAX_AGE секунд и проверяется перед использованием.
+    DB_POOL = os.getenv('DB_POOL', 'False') == 'True'
     DATABASES = {
         'default': {
-            'ENGINE': 'django.db.backends.postgresql',
+            'ENGINE': 'foodgram.postgresql',
             'NAME': os.getenv('POSTGRES_DB', 'django'),
             'USER': os.getenv('POSTGRES_USER', 'django'),
             'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
             'HOST': os.getenv('DB_HOST', 'localhost'),
-            'PORT': os.getenv('DB_PORT', 5432)
+            'PORT': os.getenv('DB_PORT', 5432),
+            'CONN_MAX_AGE': (
+                0 if DB_POOL else int(os.getenv('DB_CONN_MAX_AGE', 60))
+            ),
+            'HEALTH_CHECKS': os.getenv('DB_HEALTH_CHECKS', 'True') == 'True',
+            'POOL': {
+                'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+                'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 5)),
+                'HEALTH_CHECK_AFTER': float(
+                    os.getenv('DB_POOL_HEALTH_CHECK_AFTER', 30)
+                ),
+            } if DB_POOL else None,
         }
     }
 
+# Реплики для чтения: через запятую хосты PostgreSQL
+# (или файлы для SQLite), каждая становится алиасом replica_N.
+DATABASE_REPLICAS = []
+for index, replica in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', '').split(',')), start=1
+):
+    alias = f'replica_{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST' if 'HOST' in DATABASES['default'] else 'NAME': replica,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+# В тестах маршрутизации (api/tests.py) реплика — зеркало тестовой
+# основной базы.
+if sys.argv[1:2] == ['test'] and not DATABASE_REPLICAS:
+    DATABASES['replica'] = {
+        **DATABASES['default'], 'TEST': {'MIRROR': 'default'}
+    }
+# round_robin или least_latency.
+DATABASE_REPLICA_SELECTION = os.getenv(
+    'DB_REPLICA_SELECTION', 'round_robin'
+)
+# Сколько секунд после записи чтения клиента идут в основную базу.
+DATABASE_PIN_SECONDS = int(os.getenv('DB_PIN_SECONDS', 5))
+DATABASE_REPLICA_VIEWS = (
+    'api.views.RecipeViewSet',
+    'api.views.TegViewSet',
+    'api.views.IngredientsViewSet',
+    'api.views.UserViewSet',
+)
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['foodgram.db_router.ReplicaRouter']
+    MIDDLEWARE.append('api.middleware.ReplicaRoutingMiddleware')
+
+# Асинхронные представления для чтения (см. api/async_views.py).
+# Включаются в foodgram/asgi.py: под WSGI они только добавили бы
+# переключение между потоками.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
+ASYNC_READ_VIEWS = (
+    'recipes-list',
+    'recipes-detail',
+    'ingredients-list',
+    'ingredients-detail',
+    'tags-list',
+    'tags-detail',
+    'users-subscriptions',
+)
+# Потоков для запросов к БД из асинхронных представлений в каждом
+# воркере; с DB_POOL размер пула должен быть больше.
+ASYNC_DB_THREADS = int(os.getenv('ASYNC_DB_THREADS', 8))
+
 AUTH_USER_MODEL = 'user.User'
 
 
+# Cache
+# LocMemCache живет в памяти одного процесса: при нескольких воркерах
+# gunicorn инвалидация видна только в своем воркере, остальные обновятся
+# по REFERENCE_CACHE_TIMEOUT. Для общего кэша задайте CACHE_BACKEND
+# и CACHE_LOCATION (Redis, Memcached).
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+    }
+}
+
+REFERENCE_CACHE_ALIAS = os.getenv('REFERENCE_CACHE_ALIAS', 'default')
+REFERENCE_CACHE_TIMEOUT = int(os.getenv('REFERENCE_CACHE_TIMEOUT', 60 * 60))
+
+# Токены: кэш процесса (LRU) и общий кэш Django. Кэш процесса
+# не сбрасывается в других воркерах, поэтому его время жизни короткое,
+# 0 — отключить.
+AUTH_TOKEN_CACHE_ALIAS = os.getenv('AUTH_TOKEN_CACHE_ALIAS', 'default')
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', 5 * 60))
+AUTH_TOKEN_LOCAL_CACHE_SIZE = int(
+    os.getenv('AUTH_TOKEN_LOCAL_CACHE_SIZE', 1024)
+)
+AUTH_TOKEN_LOCAL_CACHE_TIMEOUT = int(
+    os.getenv('AUTH_TOKEN_LOCAL_CACHE_TIMEOUT', 5)
+)
+
+INGREDIENT_INDEX_TIMEOUT = int(os.getenv('INGREDIENT_INDEX_TIMEOUT', 60 * 60))
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', 50))
+
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -150,7 +264,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     "DEFAULT_PAGINATION_CLASS":
         'rest_framework.pagination.LimitOffsetPagination',
@@ -160,3 +274,60 @@ REST_FRAMEWORK = {
 USERNAME_PATTERN = r'[\w.@+-]'
 FORBIDDEN_NAMES = ('me',)
 MIN_VALUE = 1
+# Сколько рецептов можно добавить в избранное или корзину одним запросом.
+RECIPE_BATCH_MAX_SIZE = 100
+
+# Фоновая обработка картинок рецептов: 0 — синхронно, в потоке запроса.
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+IMAGE_VARIANTS = {
+    'card': (600, 600),
+    'thumbnail': (200, 200),
+}
+
+TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', 48))
+TRENDING_WINDOW_DAYS = int(os.getenv('TRENDING_WINDOW_DAYS', 14))
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+# Ограничения на картинку рецепта: размер после декодирования base64
+# и размеры в пикселях. Тело запроса на запись рецепта ограничено
+# размером картинки в base64 с запасом на остальные поля.
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.getenv('RECIPE_IMAGE_MAX_SIZE', 5 * 1024 * 1024)
+)
+RECIPE_IMAGE_MAX_DIMENSIONS = (
+    int(os.getenv('RECIPE_IMAGE_MAX_WIDTH', 4096)),
+    int(os.getenv('RECIPE_IMAGE_MAX_HEIGHT', 4096)),
+)
+RECIPE_REQUEST_MAX_SIZE = RECIPE_IMAGE_MAX_SIZE * 4 // 3 + 64 * 1024
+
+# Бюджеты запросов к БД по имени представления. При превышении
+# пишется предупреждение, а с QUERY_BUDGET_STRICT — падает запрос.
+QUERY_BUDGETS = {
+    'recipes-list': 8,
+    'recipes-detail': 6,
+    'recipes-download-shopping-cart': 3,
+    'users-subscriptions': 5,
+    'ingredients-list': 2,
+    'tags-list': 2,
+}
+QUERY_BUDGET_DEFAULT = None
+QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', 'False') == 'True'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.middleware': {
+            'handlers': ['console'],
+            'level': os.getenv('QUERY_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
@@ -3,6 +3,8 @@ from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
+from api.metrics import metrics_view
+
 from .settings import MEDIA_URL, MEDIA_ROOT
 
 router = DefaultRouter()
@@ -10,6 +12,7 @@ router = DefaultRouter()
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 urlpatterns += static(MEDIA_URL, document_root=MEDIA_ROOT)
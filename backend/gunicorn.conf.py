@@ -0,0 +1,54 @@
+import os
+import shutil
+
+from prometheus_client import multiprocess
+
+# SERVER_MODE=asgi запускает foodgram.asgi на воркерах uvicorn:
+# чтение рецептов, ингредиентов, тэгов и подписок идет через
+# асинхронные представления (см. api/async_views.py).
+if os.getenv('SERVER_MODE', 'wsgi') == 'asgi':
+    wsgi_app = 'foodgram.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'foodgram.wsgi:application'
+workers = int(os.getenv('GUNICORN_WORKERS', 1))
+# Приложение загружается и прогревается (api/warmup.py) один раз
+# в мастере, воркеры получают готовые модули и кэши при fork.
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+
+
+def warm(log):
+    from api.warmup import warmup
+    try:
+        report = warmup()
+    except Exception:
+        # Например, база еще не поднялась: воркеры прогреются
+        # на первых запросах.
+        log.exception('Warmup failed')
+        return
+    log.info('Warmup: %s', report)
+
+
+def on_starting(server):
+    # Метрики прошлого запуска не должны попасть в новые значения.
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        warm(server.log)
+        from api.warmup import prepare_fork
+        prepare_fork()
+
+
+def post_worker_init(worker):
+    if not worker.cfg.preload_app:
+        warm(worker.log)
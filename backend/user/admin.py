@@ -7,10 +7,16 @@ from food.models import Subscribe
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
     list_display = ('id', 'username', 'email', 'first_name', 'last_name')
+    readonly_fields = ('recipes_count', 'followers_count')
 
     list_filter = ('email', 'username')
 
 
 @admin.register(Subscribe)
 class SubscribeAdmin(admin.ModelAdmin):
+    """Подписки только добавляются и удаляются: счетчик подписчиков
+    пересчитывается сигналами создания и удаления."""
     list_display = ('user', 'sub_user')
+
+    def has_change_permission(self, request, obj=None):
+        return False
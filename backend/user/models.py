@@ -1,9 +1,26 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
+from django.db.models import Exists, OuterRef, Value
 
 from .validators import validate_username
 
 
+class UserQuerySet(models.QuerySet):
+
+    def annotate_subscribed(self, user):
+        if not user.is_authenticated:
+            return self.annotate(is_subscribed=Value(False))
+        return self.annotate(
+            is_subscribed=Exists(
+                user.subscribed.filter(sub_user=OuterRef('pk'))
+            )
+        )
+
+
+class FoodgramUserManager(UserManager.from_queryset(UserQuerySet)):
+    pass
+
+
 class User(AbstractUser):
     email = models.EmailField(
         verbose_name='Email', unique=True, max_length=254
@@ -17,9 +34,33 @@ class User(AbstractUser):
         validators=(validate_username,),
         unique=True
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Рецептов', default=0, editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Подписчиков', default=0, editable=False
+    )
+
+    objects = FoodgramUserManager()
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['first_name', 'last_name', 'username']
+    # Счетчики обновляются сигналами отдельными UPDATE, поэтому save()
+    # существующего пользователя их не записывает, как у Recipe.
+    DENORMALIZED_FIELDS = ('recipes_count', 'followers_count')
 
     class Meta(AbstractUser.Meta):
         ordering = ('id',)
         default_related_name = 'users'
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # Отложенные поля не загружены, их Django тоже не сохраняет.
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.DENORMALIZED_FIELDS
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)